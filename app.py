@@ -1,19 +1,23 @@
 import os
+import json
+import time
 
+import click
 from dotenv import load_dotenv
 from flask import Flask, request, jsonify, send_from_directory
 from flask_restful import Api
-from flask_jwt_extended import JWTManager
+from flask_jwt_extended import JWTManager, get_jwt_claims
 from flask_uploads import configure_uploads, patch_request_class
 from flask_migrate import Migrate
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 from werkzeug.middleware.proxy_fix import ProxyFix
-from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 
 from db import db
 from ma import ma
+from limiter import limiter
+from models.Anime import AnimeModel
 from resources.Root import Root
 from resources.Anime import AnimesList
 from resources.Anime_CRUD import GetAnime, CreateAnime, EditAnime
@@ -26,15 +30,27 @@ from resources.User import (
     Register,
     RefreshToken,
     SaveAnime,
+    SavedAnimes,
     UserInfo,
     ChangePassword
 )
 from resources.Confirmation import Activate, ResendActivationEmail, UserConfirm
 from resources.Image import ImageUpload, Image, AvatarGET, AvatarPUT
 from resources.ResetPassword import RequestPasswordReset, PasswordReset
+from resources.Recommendation import SimilarAnimes, ForYou
+from resources.Search import Search
+from resources.Autocomplete import Autocomplete
+from resources.Import import CatalogImport
+from resources.Export import CatalogExport
+from resources.Changes import CatalogChanges
 from resources.Loader_io import Loader
 
 from helpers.image_helper import IMAGE_SET
+from helpers.cache import bump_catalog_version
+from helpers.catalog_import import import_catalog, IMPORT_KINDS, FORMATS
+from helpers.current_user import CurrentUser, REGULAR_MEMBER
+from helpers.mail_queue import run_mail_worker, drain_outbound_emails
+from helpers.recommender import build_artifact
 from helpers.strings import get_text
 
 app = Flask(__name__)
@@ -54,12 +70,7 @@ num_proxies = int(os.environ.get("NUM_PROXIES", 0))
 app.wsgi_app = ProxyFix(app.wsgi_app, num_proxies=num_proxies)
 
 CORS(app)
-limiter = Limiter(
-    app,
-    key_func=get_remote_address,
-    default_limits=["2/second"],
-    headers_enabled=True
-)
+limiter.init_app(app)
 migrate = Migrate(app, db)
 # only call these two lines after setting uploaded_images_dest config.
 patch_request_class(app, 10 * 1024 * 1024)  # 10MB upload limit
@@ -84,7 +95,7 @@ def page_not_found(e):
 @jwt.user_claims_loader
 def add_claims_to_access_token(user):
     if user and hasattr(user, "role"):
-        if user.role != "Regular Member":
+        if user.role != REGULAR_MEMBER:
             claims = {
                 "admin_id": user._id,
                 "name": user.name,
@@ -93,6 +104,12 @@ def add_claims_to_access_token(user):
 
             return claims
 
+        # lets handlers identify the user without a users table lookup
+        return {
+            "user_id": user._id,
+            "role": user.role
+        }
+
 
 @jwt.user_identity_loader
 def user_identity_lookup(user):
@@ -100,6 +117,12 @@ def user_identity_lookup(user):
         return user.username
 
 
+@jwt.user_loader_callback_loader
+def load_current_user(identity):
+    # nothing is queried here, see helpers.current_user
+    return CurrentUser(identity, get_jwt_claims())
+
+
 @app.route("/favicon.ico")
 def get():
     print(get_remote_address())
@@ -110,14 +133,64 @@ def get():
     return send_from_directory(icon_path, icon_name, mimetype=mimetype)
 
 
+@app.cli.command("mail-worker")
+@click.option("--once", is_flag=True, help="Send a single batch and exit.")
+def mail_worker(once):
+    '''Sends the queued outbound emails.'''
+    if once:
+        print(f"{drain_outbound_emails()} email(s) handled.")
+    else:
+        run_mail_worker()
+
+
+@app.cli.command("reconcile-popularity")
+@click.option("--batch-size", default=1000, show_default=True, help="Animes recounted per transaction.")
+def reconcile_popularity(batch_size):
+    '''Recounts anime save counters and fixes the ones that drifted.'''
+    fixed = AnimeModel.reconcile_save_counts(batch_size)
+    if fixed:
+        bump_catalog_version()
+    print(f"{fixed} save counter(s) fixed.")
+
+
+@app.cli.command("build-recommender")
+@click.option("--every", default=0, help="Keep running and rebuild every N seconds.")
+def build_recommender(every):
+    '''Builds the recommendation matrix the web workers load.'''
+    while True:
+        print(f"{build_artifact()} anime(s) written to the recommender artifact.")
+        if not every:
+            return
+        time.sleep(every)
+
+
+@app.cli.command("import-catalog")
+@click.argument("kind", type=click.Choice(list(IMPORT_KINDS)))
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "file_format", type=click.Choice(FORMATS), default=None,
+              help="ndjson or csv, guessed from the file extension by default.")
+def import_catalog_command(kind, path, file_format):
+    '''Bulk imports anime, episodes or genre_links from an NDJSON or CSV file.'''
+    file_format = file_format or ("csv" if path.lower().endswith(".csv") else "ndjson")
+    with open(path, encoding="utf-8", newline="") as stream:
+        report = import_catalog(kind, stream, file_format)
+    print(json.dumps(report, indent=2))
+
+
 api.add_resource(Root, "/")
 api.add_resource(AnimesList, "/v1/animes")
+api.add_resource(Search, "/v1/search")
+api.add_resource(Autocomplete, "/v1/autocomplete")
 api.add_resource(GetAnime, "/v1/anime/<string:anime_id>")
+api.add_resource(SimilarAnimes, "/v1/anime/<string:anime_id>/similar")
 api.add_resource(CreateAnime, "/v1/create/anime")
 api.add_resource(EditAnime, "/v1/edit/anime/<string:anime_id>")
 api.add_resource(GetEpisode, "/v1/episode/<string:episode_id>")
 api.add_resource(CreateEpisode, "/v1/create/episode")
 api.add_resource(EditEpisode, "/v1/edit/episode/<string:episode_id>")
+api.add_resource(CatalogImport, "/v1/import/<string:kind>")
+api.add_resource(CatalogExport, "/v1/export/catalog.ndjson")
+api.add_resource(CatalogChanges, "/v1/changes")
 api.add_resource(Genres, "/v1/genres")
 api.add_resource(GenreInfo, "/v1/genre/<string:genre_name>")
 api.add_resource(Admin, "/v1/operators/admin/<int:admin_id>")
@@ -138,6 +211,8 @@ api.add_resource(UserInfo, "/v1/user/info")
 api.add_resource(AvatarGET, "/v1/user/avatar/<string:username>")
 api.add_resource(AvatarPUT, "/v1/user/avatar")
 api.add_resource(SaveAnime, "/v1/user/save_anime")
+api.add_resource(SavedAnimes, "/v1/user/saved_animes")
+api.add_resource(ForYou, "/v1/user/for_you")
 api.add_resource(Loader, "/loaderio-b8a35b9227646ad0cb661aa0a227f084/")
 
 if __name__ == "__main__":
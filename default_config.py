@@ -6,4 +6,8 @@ SQLALCHEMY_TRACK_MODIFICATIONS = False
 JWT_SECRET_KEY = os.environ["JWT_SECRET"]
 UPLOADED_IMAGES_DEST = os.path.join("static", "images")
 APP_SECRET = os.environ["APP_SECRET"]
+# memory:// keeps separate counters per worker, point it to redis:// in production
+RATELIMIT_STORAGE_URL = os.environ.get("RATELIMIT_STORAGE_URL") or "memory://"
+# the catalog cache version (helpers.cache), shared by the workers the same way
+CATALOG_VERSION_STORAGE_URL = os.environ.get("CATALOG_VERSION_STORAGE_URL") or RATELIMIT_STORAGE_URL
 PROPAGATE_EXCEPTIONS = True
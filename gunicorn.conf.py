@@ -0,0 +1,7 @@
+# read by gunicorn from the working directory, see the Procfile
+
+
+def post_worker_init(worker):
+    '''Runs in every worker once the app is imported, before the first request.'''
+    from wsgi import warm_up
+    warm_up()
@@ -0,0 +1,152 @@
+'''
+helpers.autocomplete
+
+In-memory title index for search-as-you-type.
+
+Prefixes are looked up with a binary search over a sorted list of normalized
+title keys. Every title is listed once for each of its words, so "tit" finds
+"Attack on Titan" as well. When the prefix matches too little, titles sharing
+enough trigrams with it are suggested too, which absorbs most typos.
+
+Every worker loads the index from the database before it serves requests
+(wsgi.warm_up); suggest() only loads it itself when that failed. The anime
+write handlers update it in place; other workers pick those changes up when
+they reload, every AUTOCOMPLETE_REFRESH_INTERVAL seconds.
+'''
+import os
+import threading
+from bisect import bisect_left, insort
+from collections import defaultdict
+from time import monotonic
+from typing import Dict, List, Set
+
+from models.Anime import AnimeModel
+
+AUTOCOMPLETE_REFRESH_INTERVAL = int(os.environ.get("AUTOCOMPLETE_REFRESH_INTERVAL", 300))  # seconds
+MIN_TRIGRAM_SIMILARITY = 0.4
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.casefold().split())
+
+
+def trigrams(text: str) -> Set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TitleIndex:
+    def __init__(self, refresh_interval: int):
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._titles = {}  # anime_id -> title
+        self._keys = []  # sorted (normalized title from a word start, anime_id)
+        self._trigrams = defaultdict(set)  # trigram -> anime_ids
+        self._loaded_at = None
+
+    @staticmethod
+    def _word_keys(anime_id, title: str) -> List:
+        words = normalize(title).split(" ")
+        return [(" ".join(words[i:]), anime_id) for i in range(len(words))]
+
+    def _add(self, anime_id, title: str) -> None:
+        self._titles[anime_id] = title
+        for key in self._word_keys(anime_id, title):
+            insort(self._keys, key)
+        for trigram in trigrams(normalize(title)):
+            self._trigrams[trigram].add(anime_id)
+
+    def _discard(self, anime_id) -> None:
+        title = self._titles.pop(anime_id, None)
+        if title is None:
+            return
+        for key in self._word_keys(anime_id, title):
+            position = bisect_left(self._keys, key)
+            if position < len(self._keys) and self._keys[position] == key:
+                del self._keys[position]
+        for trigram in trigrams(normalize(title)):
+            self._trigrams[trigram].discard(anime_id)
+
+    def load(self) -> None:
+        '''(Re)loads every title from the database. Needs an app context.'''
+        rows = AnimeModel.query.with_entities(AnimeModel.anime_id, AnimeModel.title).all()
+        keys = []
+        index = defaultdict(set)
+        for anime_id, title in rows:
+            keys.extend(self._word_keys(anime_id, title))
+            for trigram in trigrams(normalize(title)):
+                index[trigram].add(anime_id)
+        keys.sort()
+
+        with self._lock:
+            self._titles = {anime_id: title for anime_id, title in rows}
+            self._keys = keys
+            self._trigrams = index
+            self._loaded_at = monotonic()
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded_at is None:
+            self.load()
+        elif self.refresh_interval and monotonic() - self._loaded_at > self.refresh_interval:
+            self.load()
+
+    def invalidate(self) -> None:
+        '''Reloads everything on the next query, e.g. after a bulk import.'''
+        self._loaded_at = None
+
+    def upsert(self, anime_id, title: str) -> None:
+        if self._loaded_at is None:
+            return  # the first load reads it from the database
+        with self._lock:
+            self._discard(anime_id)
+            self._add(anime_id, title)
+
+    def remove(self, anime_id) -> None:
+        with self._lock:
+            self._discard(anime_id)
+
+    def _prefix_matches(self, prefix: str, limit: int) -> List:
+        found = {}
+        position = bisect_left(self._keys, (prefix,))
+        while position < len(self._keys) and len(found) < limit:
+            key, anime_id = self._keys[position]
+            if not key.startswith(prefix):
+                break
+            found.setdefault(anime_id, None)
+            position += 1
+        return list(found)
+
+    def _similar(self, prefix: str, limit: int, exclude: Set) -> List:
+        # the user is still typing, the trailing word boundary means nothing yet
+        wanted = trigrams(prefix) - {f"{prefix[-2:]} "}
+        shared = defaultdict(int)
+        for trigram in wanted:
+            for anime_id in self._trigrams.get(trigram, ()):
+                shared[anime_id] += 1
+
+        scored = [
+            (count / len(wanted), anime_id) for anime_id, count in shared.items()
+            if anime_id not in exclude and count / len(wanted) >= MIN_TRIGRAM_SIMILARITY
+        ]
+        scored.sort(key=lambda match: (-match[0], self._titles[match[1]]))
+        return [anime_id for _, anime_id in scored[:limit]]
+
+    def suggest(self, prefix: str, limit: int = 8) -> List[Dict]:
+        '''Titles starting with `prefix` (at any word), then close spellings.'''
+        self._ensure_loaded()
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        with self._lock:
+            matches = self._prefix_matches(prefix, limit)
+            if len(matches) < limit and len(prefix) >= 3:
+                matches += self._similar(prefix, limit - len(matches), set(matches))
+
+            return [
+                {"anime_id": str(anime_id), "title": self._titles[anime_id]}
+                for anime_id in matches
+            ]
+
+
+title_index = TitleIndex(AUTOCOMPLETE_REFRESH_INTERVAL)
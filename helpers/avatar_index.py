@@ -0,0 +1,86 @@
+'''
+helpers.avatar_index
+
+In-memory cache of avatar file stats: path -> (path, mtime, size, etag).
+
+AvatarGET looks avatars up here instead of stat'ing the disk for every
+request. A miss costs one stat of the single candidate file, and its result
+is remembered: found files for AVATAR_INDEX_TTL seconds, missing ones for
+AVATAR_MISS_TTL seconds, so avatars written or replaced by other workers show
+up after that. AvatarPUT updates the entries it has written itself.
+'''
+import os
+import threading
+from collections import namedtuple, OrderedDict
+from time import monotonic
+from typing import Iterable, Union
+
+from flask_uploads import IMAGES
+
+AVATAR_INDEX_TTL = int(os.environ.get("AVATAR_INDEX_TTL", 60))  # seconds
+AVATAR_MISS_TTL = int(os.environ.get("AVATAR_MISS_TTL", 5))  # seconds
+AVATAR_INDEX_SIZE = 10000  # remembered paths, least recently used go first
+
+AvatarEntry = namedtuple('AvatarEntry', ['path', 'mtime', 'size', 'etag'])
+
+
+def _stat_entry(path: str) -> Union[AvatarEntry, None]:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+
+    etag = f'{stat.st_mtime_ns:x}-{stat.st_size:x}'
+    return AvatarEntry(path, int(stat.st_mtime), stat.st_size, etag)
+
+
+class AvatarIndex:
+    def __init__(self, max_size: int = AVATAR_INDEX_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()  # path -> (entry or None, expires at)
+        self._lock = threading.Lock()
+
+    def _remember(self, path: str, entry: Union[AvatarEntry, None]) -> None:
+        ttl = AVATAR_INDEX_TTL if entry else AVATAR_MISS_TTL
+        with self._lock:
+            self._entries[path] = (entry, monotonic() + ttl)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _lookup_path(self, path: str) -> Union[AvatarEntry, None]:
+        with self._lock:
+            cached = self._entries.get(path, None)
+            if cached is not None and cached[1] > monotonic():
+                self._entries.move_to_end(path)
+                return cached[0]
+
+        entry = _stat_entry(path)
+        self._remember(path, entry)
+        return entry
+
+    def lookup(self, folder_path: str, name: str) -> Union[AvatarEntry, None]:
+        '''Finds a file by its path relative to the folder, e.g. 96/user_bob.webp.'''
+        return self._lookup_path(os.path.join(folder_path, name))
+
+    def lookup_any_format(self, folder_path: str, stem: str) -> Union[AvatarEntry, None]:
+        '''
+        Finds a file directly in the folder by its name without extension,
+        e.g. user_bob, as the avatars from before variants were stored.
+        '''
+        if os.path.basename(stem) != stem:
+            return None
+        for ext in IMAGES:
+            entry = self.lookup(folder_path, f'{stem}.{ext}')
+            if entry:
+                return entry
+        return None
+
+    def update(self, folder_path: str, names: Iterable[str]) -> None:
+        '''Re-stats the given files after they were written or removed.'''
+        for name in names:
+            path = os.path.join(folder_path, name)
+            self._remember(path, _stat_entry(path))
+
+
+avatar_index = AvatarIndex()
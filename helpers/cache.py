@@ -0,0 +1,128 @@
+'''
+helpers.cache
+
+In-process response caches for the catalog listing pages and for search.
+
+Entries are keyed by the catalog version along with the request parameters.
+Handlers that change the catalog call `bump_catalog_version`, which makes every
+older entry unreachable. Saving or removing an anime bumps it too, every page
+shows save counts. The version is kept in the limits storage that
+CATALOG_VERSION_STORAGE_URL points to (the rate limiter's by default), so with
+a shared one (redis://) every gunicorn worker sees a bump within
+CATALOG_VERSION_CHECK_INTERVAL seconds. With memory:// each worker only sees
+its own bumps and the others catch up when their entries expire (TTL).
+
+Search results have a cache of their own, arbitrary queries would otherwise
+push the listing pages out.
+'''
+import os
+import threading
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Hashable, Tuple
+
+from flask import current_app
+from limits.storage import storage_from_string
+
+CATALOG_CACHE_SIZE = int(os.environ.get("CATALOG_CACHE_SIZE", 512))
+CATALOG_CACHE_TTL = int(os.environ.get("CATALOG_CACHE_TTL", 60))  # seconds
+SEARCH_CACHE_SIZE = int(os.environ.get("SEARCH_CACHE_SIZE", 256))
+CATALOG_VERSION_CHECK_INTERVAL = float(os.environ.get("CATALOG_VERSION_CHECK_INTERVAL", 1))  # seconds
+CATALOG_VERSION_KEY = "myannime/catalog_version"
+CATALOG_VERSION_EXPIRY = 30 * 24 * 3600  # seconds, renewed by every bump
+
+
+class LRUCache:
+    '''A thread safe, size bounded LRU cache whose entries expire after `ttl` seconds.'''
+
+    def __init__(self, max_entries: int, ttl: int):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any:
+        '''Returns the cached value or None.'''
+        with self._lock:
+            entry = self._entries.get(key, None)
+            if entry is None:
+                return None
+
+            expires_at, value = entry
+            if monotonic() > expires_at:
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+catalog_cache = LRUCache(CATALOG_CACHE_SIZE, CATALOG_CACHE_TTL)
+search_cache = LRUCache(SEARCH_CACHE_SIZE, CATALOG_CACHE_TTL)
+_version_lock = threading.Lock()
+_version = {"value": 0, "checked_at": None}
+_storage = {"value": None}
+
+
+def _version_storage():
+    '''The storage holding the version, built on first use. Needs an app context.'''
+    if _storage["value"] is None:
+        _storage["value"] = storage_from_string(current_app.config["CATALOG_VERSION_STORAGE_URL"])
+    return _storage["value"]
+
+
+def _set_version(value: int) -> None:
+    # entries of the previous version can't be reached anymore
+    if value != _version["value"]:
+        catalog_cache.clear()
+        search_cache.clear()
+    _version["value"] = value
+    _version["checked_at"] = monotonic()
+
+
+def catalog_version() -> int:
+    '''The shared catalog version, read at most every CATALOG_VERSION_CHECK_INTERVAL seconds.'''
+    checked_at = _version["checked_at"]
+    if checked_at is not None and monotonic() - checked_at < CATALOG_VERSION_CHECK_INTERVAL:
+        return _version["value"]
+
+    with _version_lock:
+        try:
+            _set_version(int(_version_storage().get(CATALOG_VERSION_KEY) or 0))
+        except Exception as ex:
+            # storage unreachable, keep serving the version we know
+            print(f"[Catalog Cache]: {ex}")
+            _version["checked_at"] = monotonic()
+        return _version["value"]
+
+
+def catalog_cache_key(*parts: Hashable) -> Tuple:
+    '''
+    Builds a cache key for the current catalog version.
+    Take the key before querying so that a response built from data that
+    changed mid-request is stored under the old version and never served.
+    '''
+    return (catalog_version(), *parts)
+
+
+def bump_catalog_version() -> int:
+    '''Called by write handlers after the catalog has changed.'''
+    with _version_lock:
+        try:
+            value = _version_storage().incr(CATALOG_VERSION_KEY, CATALOG_VERSION_EXPIRY, elastic_expiry=True)
+        except Exception as ex:
+            print(f"[Catalog Cache]: {ex}")
+            value = _version["value"] + 1
+        _set_version(value)
+        return value
@@ -0,0 +1,253 @@
+'''
+helpers.catalog_import
+
+Bulk import of animes, episodes and genre links from NDJSON or CSV.
+
+The input is validated record by record as it streams in. Valid rows are
+written to a spooled CSV file, COPY'd into a temporary staging table and
+merged into the real table with a single INSERT ... SELECT, all in one
+transaction. Rows that fail validation, or refer to missing animes or genres,
+are left out and reported with their line numbers; the rest is imported.
+'''
+import csv
+import json
+import tempfile
+import uuid
+from time import monotonic
+from typing import Dict, IO, Iterator, Tuple
+
+from marshmallow import ValidationError
+
+from db import db
+from schemas.Anime import AnimeSchema
+from schemas.Episode import EpisodeSchema
+from schemas.Genre import GenreLinkSchema
+
+from helpers.autocomplete import title_index
+from helpers.cache import bump_catalog_version
+from helpers.genre_index import genre_index
+from helpers.strings import get_text
+
+FORMATS = ("ndjson", "csv")
+MAX_REPORTED_ERRORS = 100
+SPOOL_SIZE = 16 * 1024 * 1024  # valid rows stay in memory up to this size
+
+ANIME_COLUMNS = (
+    "anime_id", "title", "rating", "release", "status",
+    "synopsis", "number_of_episodes", "poster_uri"
+)
+EPISODE_COLUMNS = (
+    "episode_id", "anime_id", "episode_number",
+    "episode_uri_1", "episode_uri_2", "episode_uri_3", "episode_uri_4"
+)
+
+
+def _upsert(table: str, columns: Tuple, key: str) -> str:
+    # revision and updated_at come from the catalog_revision_update trigger
+    updates = ", ".join(f"{column} = EXCLUDED.{column}" for column in columns if column != key)
+    return (
+        f"INSERT INTO {table} ({', '.join(columns)}) "
+        f"SELECT {', '.join(columns)} FROM import_staging "
+        f"ON CONFLICT ({key}) DO UPDATE SET {updates}"
+    )
+
+
+ANIME_NOT_FOUND = "NOT EXISTS (SELECT 1 FROM anime_info a WHERE a.anime_id = s.anime_id)"
+
+# staging tables are typed after the target columns:
+#   schema: validates one record
+#   id: generated when a record doesn't have one
+#   unique: column groups that may appear only once per file
+#   checks: (condition on staging row s, error) rows matching the condition are dropped
+#   merge: moves the staged rows into place
+#   after: optional statement run once the rows are merged, with the
+#          distinct values the merge returned as its parameter
+IMPORT_KINDS = {
+    "anime": {
+        "schema": AnimeSchema(exclude=("genres", "genres_list")),
+        "columns": ANIME_COLUMNS,
+        "staging": f"SELECT {', '.join(ANIME_COLUMNS)} FROM anime_info",
+        "id": "anime_id",
+        "unique": (("anime_id",), ("title",)),
+        "checks": (
+            (
+                "EXISTS (SELECT 1 FROM anime_info a WHERE a.title = s.title AND a.anime_id <> s.anime_id)",
+                'import_anime_title_exists'
+            ),
+        ),
+        "merge": _upsert("anime_info", ANIME_COLUMNS, "anime_id"),
+    },
+    "episodes": {
+        "schema": EpisodeSchema(),
+        "columns": EPISODE_COLUMNS,
+        "staging": f"SELECT {', '.join(EPISODE_COLUMNS)} FROM episodes",
+        "id": "episode_id",
+        "unique": (("episode_id",), ("anime_id", "episode_number")),
+        "checks": (
+            (ANIME_NOT_FOUND, 'import_anime_not_found'),
+            (
+                "EXISTS (SELECT 1 FROM episodes e WHERE e.anime_id = s.anime_id "
+                "AND e.episode_number = s.episode_number AND e.episode_id <> s.episode_id)",
+                'import_episode_number_exists'
+            ),
+        ),
+        "merge": _upsert("episodes", EPISODE_COLUMNS, "episode_id"),
+    },
+    "genre_links": {
+        "schema": GenreLinkSchema(),
+        "columns": ("anime_id", "genre_name"),
+        "staging": "SELECT l.anime_id, g.genre_name FROM anime_genres l, genres g",
+        "id": None,
+        "unique": (("anime_id", "genre_name"),),
+        "checks": (
+            (ANIME_NOT_FOUND, 'import_anime_not_found'),
+            (
+                "NOT EXISTS (SELECT 1 FROM genres g WHERE g.genre_name = s.genre_name)",
+                'import_genre_not_found'
+            ),
+        ),
+        "merge": (
+            "INSERT INTO anime_genres (anime_id, genre_id) "
+            "SELECT s.anime_id, g.genre_id FROM import_staging s "
+            "JOIN genres g ON g.genre_name = s.genre_name "
+            "ON CONFLICT DO NOTHING "
+            "RETURNING anime_id"
+        ),
+        # the genres are part of the anime in the change feed,
+        # animes whose links were all there already keep their revision
+        "after": "UPDATE anime_info SET revision = DEFAULT WHERE anime_id = ANY(%s::uuid[])",
+    },
+}
+
+
+def read_records(stream: IO[str], file_format: str) -> Iterator[Tuple[int, Dict]]:
+    '''Yields (line number, record). Records that can't be parsed come as None.'''
+    if file_format == "csv":
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+        return
+
+    for line, text in enumerate(stream, 1):
+        if not text.strip():
+            continue
+        try:
+            record = json.loads(text)
+        except ValueError:
+            record = None
+        yield line, record if isinstance(record, dict) else None
+
+
+class ImportReport:
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.rows_read = 0
+        self.imported = 0
+        self.errors = []
+        self.started_at = monotonic()
+
+    def add_error(self, line: int, errors) -> None:
+        self.errors.append({"line": line, "errors": errors})
+
+    def json(self) -> Dict:
+        seconds = monotonic() - self.started_at
+        errors = sorted(self.errors, key=lambda error: error["line"])
+        return {
+            "kind": self.kind,
+            "rows_read": self.rows_read,
+            "imported": self.imported,
+            "seconds": round(seconds, 3),
+            "rows_per_second": round(self.rows_read / seconds) if seconds else self.rows_read,
+            "error_count": len(errors),
+            "errors": errors[:MAX_REPORTED_ERRORS]
+        }
+
+
+def _stage(kind: Dict, stream: IO[str], file_format: str, spool: IO[str], report: ImportReport) -> None:
+    '''Validates the input and writes the valid rows to `spool` as CSV.'''
+    writer = csv.writer(spool)
+    seen = {columns: {} for columns in kind["unique"]}
+
+    for line, record in read_records(stream, file_format):
+        report.rows_read += 1
+        if record is None:
+            report.add_error(line, get_text('import_invalid_record'))
+            continue
+
+        try:
+            # empty CSV cells and "" mean no value
+            row = kind["schema"].load({
+                field: None if value == "" else value for field, value in record.items()
+            })
+        except ValidationError as error:
+            report.add_error(line, error.messages)
+            continue
+
+        if kind["id"] and row.get(kind["id"], None) is None:
+            row[kind["id"]] = uuid.uuid4()
+
+        values = {
+            columns: tuple(row.get(column, None) for column in columns)
+            for columns in kind["unique"]
+        }
+        duplicate_of = next(
+            (seen[columns][value] for columns, value in values.items() if value in seen[columns]),
+            None
+        )
+        if duplicate_of:
+            report.add_error(line, get_text('import_duplicate_row').format(line=duplicate_of))
+            continue
+
+        for columns, value in values.items():
+            seen[columns][value] = line
+
+        writer.writerow([line] + [row.get(column, None) for column in kind["columns"]])
+
+
+def import_catalog(kind_name: str, stream: IO[str], file_format: str = "ndjson") -> Dict:
+    '''
+    Imports every valid record of `stream` in one transaction and returns a report
+    with the throughput and the errors per line. Needs an app context.
+    Catalog writes from elsewhere wait for the merge to commit, revisions are
+    handed out one transaction at a time.
+    '''
+    kind = IMPORT_KINDS[kind_name]
+    report = ImportReport(kind_name)
+    columns = ", ".join(kind["columns"])
+
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE, mode="w+", newline="") as spool:
+        _stage(kind, stream, file_format, spool, report)
+        spool.seek(0)
+
+        # raw psycopg2 cursor of the session's connection, same transaction
+        cursor = db.session.connection().connection.cursor()
+        try:
+            cursor.execute(
+                "CREATE TEMP TABLE import_staging ON COMMIT DROP AS "
+                f"SELECT 0 AS line, target.* FROM ({kind['staging']}) AS target WITH NO DATA"
+            )
+            cursor.copy_expert(f"COPY import_staging (line, {columns}) FROM STDIN WITH (FORMAT csv)", spool)
+
+            for condition, error in kind["checks"]:
+                cursor.execute(f"DELETE FROM import_staging s WHERE {condition} RETURNING s.line")
+                for (line,) in cursor.fetchall():
+                    report.add_error(line, get_text(error))
+
+            cursor.execute(kind["merge"])
+            report.imported = cursor.rowcount
+            if kind.get("after"):
+                returned = list({value for (value,) in cursor.fetchall()})
+                if returned:
+                    cursor.execute(kind["after"], (returned,))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    bump_catalog_version()
+    genre_index.invalidate()
+    title_index.invalidate()
+
+    return report.json()
@@ -0,0 +1,128 @@
+'''
+helpers.change_feed
+
+Incremental sync of the catalog.
+
+Animes, episodes and genres carry a revision from one shared sequence, taken
+on every insert and update, and deletions leave a tombstone with a revision of
+its own. Everything that changed after revision N is therefore the rows with
+revision > N, in revision order; a client keeps the last revision it has seen
+and asks again from there.
+
+Revisions become visible in order (see models.CatalogRevision), so as long as
+a batch is read from a single snapshot, no revision below next_revision can
+show up later.
+'''
+from typing import Dict, List
+
+from sqlalchemy.orm import Session
+
+from models.Anime import AnimeModel
+from models.CatalogRevision import CatalogTombstoneModel
+from models.Episode import EpisodeModel
+from models.Genre import GenreModel
+from schemas.Anime import AnimeSchema
+from schemas.Episode import EpisodeSchema
+from schemas.Genre import GenreSchema
+
+from helpers.snapshot import snapshot_session
+
+anime_change_schema = AnimeSchema(exclude=("genres", "genres_list", "save_count"))
+episode_change_schema = EpisodeSchema()
+genre_change_schema = GenreSchema()
+
+
+def _anime_changes(session: Session, revision: int, limit: int) -> List[Dict]:
+    rows = session.\
+        query(
+            AnimeModel.anime_id, AnimeModel.title, AnimeModel.rating, AnimeModel.release,
+            AnimeModel.status, AnimeModel.synopsis, AnimeModel.number_of_episodes,
+            AnimeModel.poster_uri, AnimeModel.revision, AnimeModel.updated_at,
+            AnimeModel.genre_names_subquery().label("genres")
+        ).\
+        filter(AnimeModel.revision > revision).\
+        order_by(AnimeModel.revision).\
+        limit(limit)
+    return [
+        {
+            "revision": row.revision,
+            "kind": "anime",
+            "op": "upsert",
+            "id": str(row.anime_id),
+            "data": {**anime_change_schema.dump(row), "genres": row.genres or []}
+        }
+        for row in rows
+    ]
+
+
+def _episode_changes(session: Session, revision: int, limit: int) -> List[Dict]:
+    episodes = session.query(EpisodeModel).\
+        filter(EpisodeModel.revision > revision).\
+        order_by(EpisodeModel.revision).\
+        limit(limit)
+    return [
+        {
+            "revision": episode.revision,
+            "kind": "episode",
+            "op": "upsert",
+            "id": str(episode.episode_id),
+            "data": episode_change_schema.dump(episode)
+        }
+        for episode in episodes
+    ]
+
+
+def _genre_changes(session: Session, revision: int, limit: int) -> List[Dict]:
+    genres = session.query(GenreModel).\
+        filter(GenreModel.revision > revision).\
+        order_by(GenreModel.revision).\
+        limit(limit)
+    return [
+        {
+            "revision": genre.revision,
+            "kind": "genre",
+            "op": "upsert",
+            "id": genre.genre_name,
+            "data": genre_change_schema.dump(genre)
+        }
+        for genre in genres
+    ]
+
+
+def _deletions(session: Session, revision: int, limit: int) -> List[Dict]:
+    tombstones = session.query(CatalogTombstoneModel).\
+        filter(CatalogTombstoneModel.revision > revision).\
+        order_by(CatalogTombstoneModel.revision).\
+        limit(limit)
+    return [
+        {
+            "revision": tombstone.revision,
+            "kind": tombstone.kind,
+            "op": "delete",
+            "id": tombstone.entity_id,
+            "data": None
+        }
+        for tombstone in tombstones
+    ]
+
+
+def changes_since(revision: int, limit: int) -> Dict:
+    '''
+    Up to `limit` changes after `revision`, oldest first. Pass next_revision
+    back as `since` for the following batch; has_more says whether there is one.
+    Genres are identified by name, animes and episodes by their uuid.
+    '''
+    # each source is ordered by revision, the first limit + 1 of each is
+    # enough to know the first limit + 1 overall
+    changes = []
+    with snapshot_session() as session:
+        for source in (_anime_changes, _episode_changes, _genre_changes, _deletions):
+            changes += source(session, revision, limit + 1)
+    changes.sort(key=lambda change: change["revision"])
+
+    batch = changes[:limit]
+    return {
+        "changes": batch,
+        "next_revision": batch[-1]["revision"] if batch else revision,
+        "has_more": len(changes) > limit
+    }
@@ -0,0 +1,52 @@
+'''
+helpers.current_user
+
+Request scoped current user for flask_jwt_extended's user loader.
+
+Access tokens carry the user's id and role as claims, so most handlers never
+need to touch the users table. When a handler does need more, `load` fetches
+only the requested columns, once per request.
+'''
+from typing import Union
+
+from models.User import UserModel
+
+REGULAR_MEMBER = "Regular Member"
+
+
+class CurrentUser:
+    '''The authenticated user of the current request, loaded lazily.'''
+
+    def __init__(self, username: str, claims: dict):
+        self.username = username
+        self.role = claims.get("role", None)
+        self._id = claims.get("user_id", None)
+        self._rows = {}
+
+    @property
+    def is_regular_member(self) -> bool:
+        # tokens issued before user claims existed carry no role at all
+        return self.role is None or self.role == REGULAR_MEMBER
+
+    @property
+    def id(self) -> Union[int, None]:
+        '''The users table id, None for operators (admins are not users).'''
+        if self._id is None and self.is_regular_member:
+            # older tokens only know the username
+            row = self.load(UserModel._id)
+            self._id = row._id if row else None
+        return self._id
+
+    def load(self, *columns) -> Union['sqlalchemy.util.KeyedTuple', None]:
+        '''
+        Returns a row with just `columns` of the user, e.g.
+        current_user.load(UserModel.password). Repeated calls are not queried again.
+        '''
+        key = tuple(column.key for column in columns)
+        if key not in self._rows:
+            self._rows[key] = UserModel.find_columns(
+                columns,
+                user_id=self._id,
+                username=self.username
+            )
+        return self._rows[key]
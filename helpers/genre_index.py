@@ -0,0 +1,173 @@
+'''
+helpers.genre_index
+
+Per-genre membership bitsets for multi-genre filtering.
+
+Every anime gets a position, and every genre a NumPy bool array with True at
+the positions of its animes. Combining genres is then a vectorized AND/OR over
+the arrays, and the result is ordered by walking precomputed sort orders, so
+only the ids of the requested page ever go to the database.
+
+The index is built for a catalog version (helpers.cache.catalog_version), so a
+change made by any worker, including save counters for the popular order, is
+noticed as soon as the version moves. The stale index keeps serving while a
+background thread rebuilds it, at most once every GENRE_INDEX_MIN_REBUILD_INTERVAL
+seconds; only the very first query of a worker waits for a build.
+'''
+import os
+import threading
+from math import ceil
+from time import monotonic
+from typing import List, Tuple
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import select
+
+from models.AnimeGenres import anime_genres
+from models.Genre import GenreModel
+from helpers.cache import catalog_version
+from helpers.snapshot import snapshot_session
+
+GENRE_INDEX_MIN_REBUILD_INTERVAL = int(os.environ.get("GENRE_INDEX_MIN_REBUILD_INTERVAL", 10))  # seconds
+
+
+class UnknownGenres(Exception):
+    def __init__(self, genre_names: List[str]):
+        self.genre_names = genre_names
+        super().__init__(", ".join(genre_names))
+
+
+class GenreIndex:
+    def __init__(self, min_rebuild_interval: int):
+        self.min_rebuild_interval = min_rebuild_interval
+        self._lock = threading.Lock()  # guards the index below
+        self._rebuild_lock = threading.Lock()  # one rebuild at a time
+        self._ids = []  # position -> anime_id
+        self._bitsets = {}  # genre_name -> bool array over positions
+        self._orders = {}  # sort method -> positions in that order
+        self._version = None  # catalog version the index was built for
+        self._stale = False
+        self._built_at = None
+
+    @property
+    def version(self):
+        '''The catalog version the index was built for, None before the first build.'''
+        return self._version
+
+    def invalidate(self) -> None:
+        '''Called after genre links changed, the next query starts a rebuild.'''
+        self._stale = True
+
+    def _fresh(self) -> bool:
+        return not self._stale and self._version == catalog_version()
+
+    def rebuild(self) -> None:
+        '''Loads animes and genre links from the database. Needs an app context.'''
+        # models.Anime imports this module to invalidate the index
+        from models.Anime import AnimeModel
+
+        with self._rebuild_lock:
+            # read before the snapshot: a change committed meanwhile moves the
+            # version again and the next query rebuilds once more
+            self._stale = False
+            version = catalog_version()
+
+            # same orders as the paged listings, sorted by the database so that
+            # titles follow its collation
+            listing_orders = {
+                "title": (AnimeModel.title, AnimeModel.anime_id),
+                "rating": (AnimeModel.rating.desc(), AnimeModel.anime_id),
+                "popular": (AnimeModel.save_count.desc(), AnimeModel.anime_id),
+            }
+
+            # one snapshot, an anime or genre added halfway can't be half indexed
+            with snapshot_session() as session:
+                ids = [
+                    row.anime_id for row in
+                    session.query(AnimeModel.anime_id).order_by(*listing_orders["title"])
+                ]
+                positions = {anime_id: position for position, anime_id in enumerate(ids)}
+
+                orders = {"title": np.arange(len(ids), dtype=np.int64)}
+                for sort_by in ("rating", "popular"):
+                    orders[sort_by] = np.fromiter(
+                        (
+                            positions[row.anime_id] for row in
+                            session.query(AnimeModel.anime_id).order_by(*listing_orders[sort_by])
+                        ),
+                        dtype=np.int64,
+                        count=len(ids)
+                    )
+
+                members = {genre.genre_name: [] for genre in session.query(GenreModel.genre_name)}
+                links = session.execute(
+                    select([anime_genres.c.anime_id, GenreModel.genre_name]).
+                    select_from(anime_genres.join(GenreModel.__table__))
+                )
+                for anime_id, genre_name in links:
+                    members[genre_name].append(positions[anime_id])
+
+            bitsets = {}
+            for genre_name, genre_positions in members.items():
+                bitset = np.zeros(len(ids), dtype=np.bool_)
+                bitset[genre_positions] = True
+                bitsets[genre_name] = bitset
+
+            with self._lock:
+                self._ids = ids
+                self._bitsets = bitsets
+                self._orders = orders
+                self._version = version
+                self._built_at = monotonic()
+
+    def _rebuild_in_background(self, app) -> None:
+        if self._rebuild_lock.locked():
+            return
+        if self._built_at is not None and monotonic() - self._built_at < self.min_rebuild_interval:
+            return
+
+        def run():
+            try:
+                with app.app_context():
+                    self.rebuild()
+            except Exception as ex:
+                print(f"[Genre Index]: {ex}")
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def filter(
+        self,
+        genre_names: List[str],
+        match_all: bool = True,
+        sort_by: str = "title",
+        page_number: int = 1,
+        per_page: int = 24
+    ) -> Tuple[List, int, int]:
+        '''
+        Returns (anime ids of the page, total matches, total pages) for animes in
+        all (match_all) or any of `genre_names`. Raises UnknownGenres.
+        '''
+        if self._version is None:
+            self.rebuild()  # nothing to serve yet
+        elif not self._fresh():
+            self._rebuild_in_background(current_app._get_current_object())
+
+        with self._lock:
+            unknown = [name for name in genre_names if name not in self._bitsets]
+            if unknown:
+                raise UnknownGenres(unknown)
+
+            bitsets = [self._bitsets[name] for name in genre_names]
+            combine = np.logical_and if match_all else np.logical_or
+            mask = combine.reduce(bitsets)
+
+            order = self._orders.get(sort_by, self._orders["title"])
+            matches = order[mask[order]]
+
+            start = (page_number - 1) * per_page
+            page = [self._ids[position] for position in matches[start:start + per_page]]
+            return page, len(matches), ceil(len(matches) / per_page)
+
+
+genre_index = GenreIndex(GENRE_INDEX_MIN_REBUILD_INTERVAL)
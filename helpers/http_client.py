@@ -0,0 +1,123 @@
+'''
+helpers.http_client
+
+Shared client for outbound HTTP calls (Sirv, SendInBlue).
+
+Each host gets its own requests.Session, i.e. a pool of keep-alive connections,
+so only the first call pays for the TCP and TLS handshakes. Every call has
+connect/read timeouts, a bounded number of retries and its latency recorded.
+The figures of each worker go to the log every HTTP_METRICS_LOG_INTERVAL
+seconds, printed by the first call after the interval is up.
+'''
+import os
+import threading
+from time import monotonic, perf_counter
+from typing import Dict
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_TIMEOUT = (3.05, 10)  # (connect, read) seconds
+POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", 10))
+METRICS_LOG_INTERVAL = int(os.environ.get("HTTP_METRICS_LOG_INTERVAL", 300))  # seconds, 0 turns it off
+# Connection errors are retried for every method since nothing has been sent yet.
+# Bad gateway statuses are retried only for idempotent methods (urllib3 default),
+# so a POST never goes out twice.
+RETRIES = Retry(
+    total=2,
+    read=0,
+    backoff_factor=0.3,
+    status_forcelist=(502, 503, 504),
+    raise_on_status=False
+)
+
+_sessions = {}
+_metrics = {}
+_logged_at = {"value": monotonic()}
+_lock = threading.Lock()
+
+
+def _host(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def _get_session(host: str) -> requests.Session:
+    session = _sessions.get(host, None)
+    if session:
+        return session
+
+    with _lock:
+        if host not in _sessions:
+            adapter = HTTPAdapter(
+                pool_connections=1,
+                pool_maxsize=POOL_SIZE,
+                max_retries=RETRIES
+            )
+            session = requests.Session()
+            session.mount(host, adapter)
+            _sessions[host] = session
+
+        return _sessions[host]
+
+
+def _record(host: str, elapsed: float, failed: bool) -> None:
+    with _lock:
+        metric = _metrics.setdefault(host, {
+            "calls": 0,
+            "errors": 0,
+            "total_seconds": 0.0,
+            "max_seconds": 0.0
+        })
+        metric["calls"] += 1
+        metric["errors"] += int(failed)
+        metric["total_seconds"] += elapsed
+        metric["max_seconds"] = max(metric["max_seconds"], elapsed)
+
+
+def request(method: str, url: str, **kwargs) -> requests.Response:
+    '''
+    Same as requests.request but goes through the pooled session of the host.
+    Raises requests.RequestException like requests does.
+    '''
+    kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+    host = _host(url)
+    session = _get_session(host)
+    started = perf_counter()
+    failed = True
+
+    try:
+        response = session.request(method, url, **kwargs)
+        failed = response.status_code >= 500
+        return response
+
+    finally:
+        _record(host, perf_counter() - started, failed)
+        _log_metrics()
+
+
+def get_metrics() -> Dict:
+    '''Returns per host call count, error count and latency figures.'''
+    with _lock:
+        return {
+            host: {
+                **metric,
+                "avg_seconds": metric["total_seconds"] / metric["calls"]
+            }
+            for host, metric in _metrics.items()
+        }
+
+
+def _log_metrics() -> None:
+    with _lock:
+        if not METRICS_LOG_INTERVAL or monotonic() - _logged_at["value"] < METRICS_LOG_INTERVAL:
+            return
+        _logged_at["value"] = monotonic()
+
+    for host, metric in get_metrics().items():
+        print(
+            f"[HTTP Client]: pid {os.getpid()} {host} {metric['calls']} call(s), {metric['errors']} error(s), "
+            f"avg {metric['avg_seconds']:.3f}s, max {metric['max_seconds']:.3f}s"
+        )
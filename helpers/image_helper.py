@@ -1,8 +1,10 @@
 import os
 import re
-from typing import Union
+import hashlib
+import tempfile
+from typing import BinaryIO, List, Union
 from werkzeug.datastructures import FileStorage
-from flask_uploads import UploadSet, IMAGES
+from flask_uploads import UploadSet, UploadNotAllowed, IMAGES
 from PIL import Image
 
 # set name and allowed extensions
@@ -11,6 +13,19 @@ from PIL import Image
 # IMAGES from "UPLOADED_IMAGES_DEST" and images from UploadSet's first arguent must be the same.
 IMAGE_SET = UploadSet('images', IMAGES)
 
+# every avatar is stored in all of these sizes (bounding box, px) and formats
+AVATAR_SIZES = (48, 96, 192, 300)
+AVATAR_FORMATS = {
+    "webp": "WEBP",
+    "jpg": "JPEG",
+}
+AVATAR_MIMETYPES = {
+    "webp": "image/webp",
+    "jpg": "image/jpeg",
+}
+# avatars are served straight from disk by nginx, which runs as another user
+AVATAR_FILE_MODE = 0o644
+
 
 def save_image(image: FileStorage, folder: str = None, name: str = None) -> str:
     '''
@@ -19,6 +34,27 @@ def save_image(image: FileStorage, folder: str = None, name: str = None) -> str:
     return IMAGE_SET.save(image, folder, name)
 
 
+def get_upload_name(image: FileStorage) -> str:
+    '''
+    Returns the sanitized filename of an upload, raises UploadNotAllowed for
+    disallowed extensions. Same checks as save_image without touching the disk.
+    '''
+    basename = IMAGE_SET.get_basename(image.filename)
+    if not IMAGE_SET.file_allowed(image, basename):
+        raise UploadNotAllowed()
+    return basename
+
+
+def get_sha256(stream: BinaryIO, chunk_size: int = 64 * 1024) -> str:
+    '''Hashes a seekable stream chunk by chunk and rewinds it.'''
+    start = stream.tell()
+    sha256 = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(chunk_size), b''):
+        sha256.update(chunk)
+    stream.seek(start)
+    return sha256.hexdigest()
+
+
 def get_path(filename: str = None, folder: str = None) -> str:
     '''
     Takes image name and folder and return full path.
@@ -26,6 +62,11 @@ def get_path(filename: str = None, folder: str = None) -> str:
     return IMAGE_SET.path(filename, folder)
 
 
+def get_folder_path(folder: str) -> str:
+    '''Takes a folder name and returns its full path.'''
+    return os.path.normpath(IMAGE_SET.path('', folder))
+
+
 def find_image_any_format(filename: str = None, folder: str = None) -> Union[str, None]:
     '''
     Takes an image name without extension and return image of the any accepted formats.
@@ -74,12 +115,79 @@ def get_name_without_ext(filename: str) -> str:
     return os.path.splitext(filename)[0]
 
 
-def change_image_type_and_resize(image_path: str, filename: str) -> None:
-    '''Changes the image type to jpg'''
-    image_path = f'{image_path}/{filename}'
-    image = Image.open(image_path)
+def avatar_variant_name(filename: str, size: int, ext: str) -> str:
+    '''Returns the path of an avatar variant, relative to the avatar folder.
+    avatar_variant_name('user_bob', 96, 'webp') -> '96/user_bob.webp'
+    Every size has its own folder: a suffix on the name could be part of
+    another username (user_bob_96), and the folder itself only holds the
+    single file avatars from before variants existed.
+    '''
+    return os.path.join(str(size), f'{filename}.{ext}')
+
+
+def avatar_variant_names(filename: str) -> List[str]:
+    '''File names of every variant save_avatar_variants writes.'''
+    return [
+        avatar_variant_name(filename, size, ext)
+        for size in AVATAR_SIZES
+        for ext in AVATAR_FORMATS
+    ]
+
+
+def pick_avatar_size(requested: int) -> int:
+    '''Smallest stored size that is at least as large as requested.'''
+    for size in AVATAR_SIZES:
+        if size >= requested:
+            return size
+    return AVATAR_SIZES[-1]
+
+
+def _flatten(image: Image.Image) -> Image.Image:
+    '''JPEG has no alpha channel, transparent parts become white.'''
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.split()[-1])
+        return background
+    return image.convert("RGB")
+
+
+def _save_atomically(image: Image.Image, path: str, image_format: str) -> None:
+    '''Writes to a temporary file next to path and renames it into place.'''
+    folder, name = os.path.split(path)
+    fd, temp_path = tempfile.mkstemp(dir=folder, prefix=f'.{name}.')
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            # mkstemp creates the file 0600 and os.replace keeps the mode
+            os.fchmod(temp_file.fileno(), AVATAR_FILE_MODE)
+            image.save(temp_file, image_format, quality=85)
+        os.replace(temp_path, path)
+    except Exception:
+        os.remove(temp_path)
+        raise
+
+
+def save_avatar_variants(source: Union[str, BinaryIO], target_folder: str, filename: str) -> None:
+    '''
+    Crops the avatar (top 80% of a 300x300 thumbnail) and writes it in every
+    AVATAR_SIZES and AVATAR_FORMATS, e.g. avatars/96/user_bob.webp.
+    Needs no app context so it can run in helpers.image_workers.
+    Raises PIL.UnidentifiedImageError if the source is not an image.
+    '''
+    for size in AVATAR_SIZES:
+        os.makedirs(os.path.join(target_folder, str(size)), exist_ok=True)
+
+    image = Image.open(source)
+    # JPEGs get decoded at a reduced scale (no-op for other formats)
+    image.draft("RGB", (300, 300))
     image.thumbnail((300, 300))
     w, h = image.size
-    new_im = image.crop((0, 0, w, int(h*0.8)))
-    new_im.save(image_path)
-    return None
+    avatar = _flatten(image.crop((0, 0, w, int(h*0.8))))
+
+    for size in AVATAR_SIZES:
+        variant = avatar.copy()
+        variant.thumbnail((size, size))
+        for ext, image_format in AVATAR_FORMATS.items():
+            path = os.path.join(
+                target_folder, avatar_variant_name(filename, size, ext))
+            _save_atomically(variant, path, image_format)
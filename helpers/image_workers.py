@@ -0,0 +1,119 @@
+'''
+helpers.image_workers
+
+Runs Pillow transforms in a process pool instead of the request worker.
+
+Admission is bounded host wide: a job first has to grab one of IMAGE_JOB_SLOTS
+slot files with a non-blocking flock, shared by every gunicorn worker on the
+machine. When all slots are taken ImageWorkersBusy is raised straight away,
+so a burst of uploads is answered with 503 instead of piling up on the CPUs.
+'''
+import os
+import fcntl
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO
+
+from helpers import image_helper
+
+IMAGE_WORKERS = int(os.environ.get("IMAGE_WORKERS", 1))  # processes per web worker
+IMAGE_JOB_SLOTS = int(os.environ.get("IMAGE_JOB_SLOTS", os.cpu_count() or 1))
+IMAGE_JOB_TIMEOUT = 30  # seconds
+RETRY_AFTER = 5  # seconds, sent to clients with 503
+SLOTS_FOLDER = os.path.join(tempfile.gettempdir(), "myannime_image_slots")
+
+_executor = None
+_executor_lock = threading.Lock()
+_held_slots = set()
+
+
+class ImageWorkersBusy(Exception):
+    def __init__(self, message="All image workers are busy."):
+        self.message = message
+        super().__init__(self.message)
+
+    def __str__(self):
+        return self.message
+
+
+def _close_inherited_slots() -> None:
+    '''
+    Pool processes are forked while a slot is held, they would keep
+    the lock alive for as long as they live unless they let go of it.
+    '''
+    for fd in list(_held_slots):
+        os.close(fd)
+    _held_slots.clear()
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    # created lazily so that every gunicorn worker gets its own pool after the fork
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=IMAGE_WORKERS, initializer=_close_inherited_slots)
+        return _executor
+
+
+def _acquire_slot() -> int:
+    '''Returns the descriptor of a locked slot file. Raises ImageWorkersBusy.'''
+    os.makedirs(SLOTS_FOLDER, exist_ok=True)
+    for slot in range(IMAGE_JOB_SLOTS):
+        fd = os.open(os.path.join(SLOTS_FOLDER, f"slot_{slot}.lock"),
+                     os.O_RDWR | os.O_CREAT)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            _held_slots.add(fd)
+            return fd
+        except BlockingIOError:
+            os.close(fd)
+
+    raise ImageWorkersBusy()
+
+
+def _release_slot(fd: int) -> None:
+    # closing the descriptor drops the lock
+    _held_slots.discard(fd)
+    os.close(fd)
+
+
+def _finish_job(temp_path: str, slot: int) -> None:
+    try:
+        os.remove(temp_path)
+    except FileNotFoundError:
+        pass
+    _release_slot(slot)
+
+
+def save_avatar_variants(stream: BinaryIO, target_folder: str, filename: str) -> None:
+    '''
+    Process pool counterpart of image_helper.save_avatar_variants.
+    The upload is spooled to a temporary file next to the avatars since
+    streams can't be handed over to another process.
+    Raises concurrent.futures.TimeoutError after IMAGE_JOB_TIMEOUT seconds.
+    '''
+    slot = _acquire_slot()
+    temp_path = None
+    future = None
+    try:
+        os.makedirs(target_folder, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=target_folder, prefix=".upload_")
+        with os.fdopen(fd, "wb") as temp_file:
+            shutil.copyfileobj(stream, temp_file)
+
+        future = _get_executor().submit(
+            image_helper.save_avatar_variants, temp_path, target_folder, filename)
+
+    finally:
+        if future is None:
+            if temp_path:
+                os.remove(temp_path)
+            _release_slot(slot)
+
+    # a job that times out keeps running, its input file and its slot
+    # are only let go of once it has really finished
+    future.add_done_callback(lambda _: _finish_job(temp_path, slot))
+    future.result(timeout=IMAGE_JOB_TIMEOUT)
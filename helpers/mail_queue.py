@@ -0,0 +1,73 @@
+'''
+helpers.mail_queue
+
+Outbound email queue. Request handlers only insert a row into outbound_emails,
+the mail worker (`flask mail-worker`) sends them to SendInBlue in batches and
+retries failures with exponential backoff.
+'''
+import os
+from contextlib import contextmanager
+from time import sleep
+from typing import Dict
+
+from db import db
+from models.OutboundEmail import OutboundEmailModel
+
+from helpers.send_in_blue import SendInBlue
+
+MAIL_BATCH_SIZE = int(os.environ.get("MAIL_BATCH_SIZE", 20))
+MAIL_POLL_INTERVAL = int(os.environ.get("MAIL_POLL_INTERVAL", 5))  # seconds
+
+
+def queue_email(payload: Dict) -> None:
+    '''Stores an email payload (see SendInBlue) to be sent by the mail worker.'''
+    OutboundEmailModel(payload).save_to_db()
+
+
+@contextmanager
+def _keep_loaded():
+    '''
+    Commits don't expire the loaded rows meanwhile. The claimed emails are
+    leased to this worker, reloading them after every commit would only cost
+    a SELECT per email.
+    '''
+    session = db.session()
+    session.expire_on_commit = False
+    try:
+        yield
+    finally:
+        session.expire_on_commit = True
+
+
+def drain_outbound_emails(batch_size: int = MAIL_BATCH_SIZE) -> int:
+    '''
+    Claims one batch of due emails, sends them one by one outside of any
+    transaction and commits the outcome of each. Returns the number of emails handled.
+    '''
+    with _keep_loaded():
+        emails = OutboundEmailModel.claim_due(batch_size)
+        for email in emails:
+            try:
+                SendInBlue.send(email.payload)
+                email.mark_sent()
+            except Exception as err:
+                # anything, a timeout or a malformed payload, counts against the email
+                print(f"[Mail Worker]: email {email.email_id}: {err!r}")
+                email.mark_failed(repr(err))
+            db.session.commit()
+
+    return len(emails)
+
+
+def run_mail_worker(batch_size: int = MAIL_BATCH_SIZE, poll_interval: int = MAIL_POLL_INTERVAL) -> None:
+    '''Drains the queue forever. Sleeps only when there is nothing left to send.'''
+    while True:
+        try:
+            handled = drain_outbound_emails(batch_size)
+        except Exception as ex:
+            print(f"[Mail Worker]: {ex}")
+            db.session.rollback()
+            handled = 0
+
+        if handled < batch_size:
+            sleep(poll_interval)
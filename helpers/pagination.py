@@ -0,0 +1,159 @@
+'''
+helpers.pagination
+
+Keyset (cursor) pagination. Instead of OFFSET/COUNT, every page filters on the
+sort key of the last row the client has seen, so page N costs the same as page 1.
+
+The cursor handed to clients is opaque: urlsafe base64 of a small json document
+holding the sort method, the direction and the sort key values of a row.
+Cursors of filtered queries (search) also carry a hash of the filters, so a
+cursor can't be replayed against another query. Decoding turns the values back
+into the types of their sort keys, a tampered cursor is an InvalidCursor
+rather than a database error.
+'''
+import hashlib
+import json
+import uuid
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from typing import List, Union
+
+from sqlalchemy import tuple_
+from sqlalchemy.dialects.postgresql import UUID
+
+NEXT = "next"
+PREV = "prev"
+
+
+class InvalidCursor(Exception):
+    def __init__(self, message="Invalid pagination cursor."):
+        self.message = message
+        super().__init__(self.message)
+
+    def __str__(self):
+        return self.message
+
+
+class KeysetPage:
+    '''A page of rows along with the cursors pointing to its neighbours.'''
+
+    def __init__(self, items: List, next_cursor: Union[str, None], prev_cursor: Union[str, None]):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+
+def cursor_scope(*parts) -> str:
+    '''A short hash of the query parameters a cursor is only valid for.'''
+    raw = json.dumps(parts, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def encode_cursor(sort_by: str, values: List, direction: str = NEXT, scope: str = None) -> str:
+    '''Packs sort key values into an opaque cursor string.'''
+    document = {"s": sort_by, "d": direction, "v": values}
+    if scope is not None:
+        document["q"] = scope
+    # uuid and similar values are not json serializable, they go as strings
+    raw = json.dumps(document, separators=(",", ":"), default=str)
+    return urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def _coerce(value, key):
+    '''`value` as the python type of `key`, raises InvalidCursor when it isn't one.'''
+    if isinstance(key.type, UUID):
+        try:
+            return uuid.UUID(value)
+        except (TypeError, ValueError, AttributeError):
+            raise InvalidCursor()
+
+    python_type = key.type.python_type
+    if isinstance(value, bool):
+        raise InvalidCursor()
+    if python_type is float and isinstance(value, (int, float)):
+        return float(value)
+    # postgres strings can't hold NUL
+    if isinstance(value, python_type) and not (python_type is str and "\x00" in value):
+        return value
+    raise InvalidCursor()
+
+
+def decode_cursor(cursor: str, sort_by: str, keys: List, scope: str = None) -> dict:
+    '''
+    Unpacks a cursor and makes sure it belongs to the requested sort method and
+    scope, and that its values fit `keys`.
+    '''
+    try:
+        document = json.loads(urlsafe_b64decode(cursor.encode("ascii")))
+        direction = document["d"]
+        values = document["v"]
+        cursor_sort_by = document["s"]
+        cursor_scope = document.get("q", None)
+    except Exception:
+        raise InvalidCursor()
+
+    if cursor_sort_by != sort_by or cursor_scope != scope or direction not in (NEXT, PREV):
+        raise InvalidCursor()
+
+    if not isinstance(values, list) or len(values) != len(keys):
+        raise InvalidCursor()
+
+    return {"direction": direction, "values": [_coerce(value, key) for value, key in zip(values, keys)]}
+
+
+def _row_values(row, keys: List) -> List:
+    return [getattr(row, key.key) for key in keys]
+
+
+def keyset_paginate(
+    query,
+    keys: List,
+    sort_by: str,
+    cursor: str = None,
+    per_page: int = 24,
+    descending: bool = False,
+    scope: str = None
+) -> KeysetPage:
+    '''
+    Returns one page of `query` ordered by `keys`.
+    `keys` must end with a unique column so that the ordering is total,
+    e.g. [AnimeModel.title, AnimeModel.anime_id], and have typed values.
+    Rows must expose every key as an attribute of the same name.
+    `scope` (see cursor_scope) ties the cursors to the filters of `query`.
+    '''
+    position = decode_cursor(cursor, sort_by, keys, scope) if cursor else None
+    backwards = position is not None and position["direction"] == PREV
+    # walking backwards over an ascending order is the same as
+    # walking forwards over the descending one, and vice versa.
+    towards_smaller = descending != backwards
+
+    if position:
+        row_key = tuple_(*keys)
+        boundary = tuple_(*position["values"])
+        if towards_smaller:
+            query = query.filter(row_key < boundary)
+        else:
+            query = query.filter(row_key > boundary)
+
+    order = [key.desc() if towards_smaller else key.asc() for key in keys]
+    # one extra row tells us whether there is anything beyond this page
+    rows = query.order_by(*order).limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    if backwards:
+        rows.reverse()
+
+    if not rows:
+        # stepped past the end, the only way is back to where we came from
+        prev_cursor = None
+        if position and not backwards:
+            prev_cursor = encode_cursor(sort_by, position["values"], PREV, scope)
+        return KeysetPage([], None, prev_cursor)
+
+    first = encode_cursor(sort_by, _row_values(rows[0], keys), PREV, scope)
+    last = encode_cursor(sort_by, _row_values(rows[-1], keys), NEXT, scope)
+
+    if backwards:
+        return KeysetPage(rows, last, first if has_more else None)
+
+    return KeysetPage(rows, last if has_more else None, first if position else None)
@@ -0,0 +1,290 @@
+'''
+helpers.recommender
+
+"Users who saved this also saved" and "for you" recommendations, served from an
+in-memory item-item co-occurrence matrix built out of user_animes.
+
+co[i, j] is the number of users who saved both anime i and anime j, counts[i]
+the number of users who saved anime i. Scores are cosine similarities,
+co[i, j] / sqrt(counts[i] * counts[j]), so the most saved titles don't top
+every list.
+
+The matrix is built outside the web workers, by `flask build-recommender` (the
+recommender process in the Procfile), and stored in the database so that every
+dyno sees the same one. Saves and removals are logged to recommender_changes in
+the same transaction as the change itself.
+
+Every RECOMMENDER_SYNC_INTERVAL seconds a worker, in the background, either
+loads a newer artifact or applies the changes committed since it last looked,
+as small deltas on top of the matrix. Which changes an artifact or a worker
+has seen is tracked with database snapshots (txid_current_snapshot), not
+clocks, so every change is counted exactly once and in every worker.
+'''
+import io
+import os
+import threading
+import uuid
+from collections import defaultdict, Counter
+from itertools import combinations
+from time import monotonic
+from typing import Iterable, List, Set
+
+import numpy as np
+from flask import current_app
+from scipy import sparse
+from sqlalchemy import func, select
+
+from models.Recommender import RecommenderArtifactModel, RecommenderChangeModel
+from models.UserAnimes import user_animes
+
+from helpers.snapshot import snapshot_session
+
+RECOMMENDER_SYNC_INTERVAL = int(os.environ.get("RECOMMENDER_SYNC_INTERVAL", 10))  # seconds
+BUILD_CHUNK_SIZE = 100000
+# the first statement of a snapshot session, everything after it reads the same snapshot
+CURRENT_SNAPSHOT = "SELECT txid_current_snapshot()::text"
+
+
+def _read_saves(connection):
+    '''
+    Reads user_animes into preallocated arrays, as
+    (user ids, anime positions, position -> anime_id).
+    '''
+    total = connection.execute(select([func.count()]).select_from(user_animes)).scalar()
+    user_ids = np.empty(total, dtype=np.int64)
+    columns = np.empty(total, dtype=np.int32)
+    positions = {}
+
+    result = connection.\
+        execution_options(stream_results=True).\
+        execute(select([user_animes.c.user_id, user_animes.c.anime_id]))
+    filled = 0
+    while True:
+        rows = result.fetchmany(BUILD_CHUNK_SIZE)
+        if not rows:
+            break
+        end = filled + len(rows)
+        user_ids[filled:end] = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        columns[filled:end] = np.fromiter(
+            (positions.setdefault(row[1], len(positions)) for row in rows),
+            dtype=np.int32,
+            count=len(rows)
+        )
+        filled = end
+
+    ids = [None] * len(positions)
+    for anime_id, position in positions.items():
+        ids[position] = anime_id
+    return user_ids[:filled], columns[:filled], ids
+
+
+def build_artifact() -> int:
+    '''
+    Builds the co-occurrence matrix from user_animes and stores it in the database.
+    Returns the number of animes. Needs an app context.
+    '''
+    with snapshot_session() as session:
+        snapshot = session.execute(CURRENT_SNAPSHOT).scalar()
+        user_ids, columns, ids = _read_saves(session.connection())
+
+    _, rows = np.unique(user_ids, return_inverse=True)
+    del user_ids
+
+    # users x animes, 1 where the user saved the anime
+    saves = sparse.csr_matrix(
+        (np.ones(len(columns), dtype=np.int32), (rows, columns)),
+        shape=(rows.max() + 1 if len(rows) else 0, len(ids))
+    )
+    del rows, columns
+    saves.sum_duplicates()
+    saves.data[:] = 1
+
+    matrix = (saves.T @ saves).tocsr()
+    counts = matrix.diagonal().astype(np.int64)
+    matrix.setdiag(0)
+    matrix.eliminate_zeros()
+
+    artifact = io.BytesIO()
+    np.savez(
+        artifact,
+        ids=np.array([str(anime_id) for anime_id in ids], dtype="U36"),
+        data=matrix.data,
+        indices=matrix.indices,
+        indptr=matrix.indptr,
+        shape=np.array(matrix.shape, dtype=np.int64),
+        counts=counts
+    )
+    RecommenderArtifactModel.save(snapshot, artifact.getvalue())
+
+    return len(ids)
+
+
+class CoOccurrenceRecommender:
+    def __init__(self, sync_interval: int):
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()  # guards the matrix state below
+        self._load_lock = threading.Lock()  # one load at a time
+        self._ids = []  # position -> anime_id
+        self._positions = {}  # anime_id -> position
+        self._matrix = sparse.csr_matrix((0, 0), dtype=np.int32)
+        self._counts = np.zeros(0, dtype=np.int64)
+        self._delta = defaultdict(Counter)  # changes the artifact doesn't contain
+        self._artifact_id = None
+        self._snapshot = None  # the changes visible in it are applied
+        self._checked_at = monotonic()
+
+    @property
+    def ready(self) -> bool:
+        return self._artifact_id is not None
+
+    def load(self) -> bool:
+        '''
+        Loads the newest artifact, or applies the changes committed since the
+        last call when it is loaded already. False when there is no artifact yet.
+        Needs an app context.
+        '''
+        with self._load_lock:
+            with snapshot_session() as session:
+                snapshot = session.execute(CURRENT_SNAPSHOT).scalar()
+                artifact_id = session.query(func.max(RecommenderArtifactModel.artifact_id)).scalar()
+                if artifact_id is None:
+                    return False
+
+                if artifact_id == self._artifact_id:
+                    changes = RecommenderChangeModel.not_visible_in(session, self._snapshot)
+                    with self._lock:
+                        for before, after in changes:
+                            self._apply(before, after)
+                        self._snapshot = snapshot
+                    return True
+
+                artifact = session.query(RecommenderArtifactModel).get(artifact_id)
+                data = artifact.data
+                changes = RecommenderChangeModel.not_visible_in(session, artifact.snapshot)
+
+            with np.load(io.BytesIO(data)) as arrays:
+                ids = [uuid.UUID(anime_id) for anime_id in arrays["ids"]]
+                matrix = sparse.csr_matrix(
+                    (arrays["data"], arrays["indices"], arrays["indptr"]),
+                    shape=tuple(arrays["shape"])
+                )
+                counts = arrays["counts"]
+            del data
+
+            with self._lock:
+                self._ids = ids
+                self._positions = {anime_id: position for position, anime_id in enumerate(ids)}
+                self._matrix = matrix
+                self._counts = counts
+                self._delta = defaultdict(Counter)
+                for before, after in changes:
+                    self._apply(before, after)
+                self._artifact_id = artifact_id
+                self._snapshot = snapshot
+            return True
+
+    def _load_in_background(self, app) -> None:
+        if self._load_lock.locked():
+            return
+
+        def run():
+            try:
+                with app.app_context():
+                    self.load()
+            except Exception as ex:
+                print(f"[Recommender]: {ex}")
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _check_for_update(self) -> None:
+        '''At most every sync_interval seconds, a background load.'''
+        if monotonic() - self._checked_at < self.sync_interval:
+            return
+        self._checked_at = monotonic()
+        self._load_in_background(current_app._get_current_object())
+
+    def _position(self, anime_id) -> int:
+        '''Position of an anime, animes first saved after the build are appended.'''
+        position = self._positions.get(anime_id, None)
+        if position is None:
+            position = len(self._ids)
+            self._positions[anime_id] = position
+            self._ids.append(anime_id)
+            self._counts = np.append(self._counts, 0)
+        return position
+
+    def _shift(self, changed: List[int], kept: List[int], step: int) -> None:
+        for i in changed:
+            self._counts[i] += step
+            for j in kept:
+                self._delta[i][j] += step
+                self._delta[j][i] += step
+
+        for i, j in combinations(changed, 2):
+            self._delta[i][j] += step
+            self._delta[j][i] += step
+
+    def _apply(self, before: Set, after: Set) -> None:
+        gained = [self._position(anime_id) for anime_id in after - before]
+        lost = [self._position(anime_id) for anime_id in before - after]
+        kept = [self._position(anime_id) for anime_id in before & after]
+        self._shift(gained, kept, 1)
+        self._shift(lost, kept, -1)
+
+    def _scores(self, positions: Iterable[int]) -> np.ndarray:
+        '''Sum of the cosine similarity rows of `positions`, dense.'''
+        norms = np.sqrt(np.maximum(self._counts, 1))
+        scores = np.zeros(len(self._ids), dtype=np.float64)
+        indptr, indices, data = self._matrix.indptr, self._matrix.indices, self._matrix.data
+
+        for i in positions:
+            weight = 1 / norms[i]
+            if i < self._matrix.shape[0]:
+                start, end = indptr[i], indptr[i + 1]
+                # column indices are unique within a row, fancy += is safe
+                scores[indices[start:end]] += data[start:end] * weight
+            for j, step in self._delta.get(i, {}).items():
+                scores[j] += step * weight
+
+        return scores / norms
+
+    def _top(self, scores: np.ndarray, k: int, exclude: Iterable[int]) -> List:
+        if k < 1:
+            return []
+
+        scores[list(exclude)] = 0
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+
+        ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [self._ids[position] for position in ranked]
+
+    def similar(self, anime_id, k: int = 12) -> List:
+        '''Ids of the k animes most often saved along with `anime_id`.'''
+        self._check_for_update()
+        with self._lock:
+            position = self._positions.get(anime_id, None)
+            if position is None:
+                return []
+            return self._top(self._scores([position]), k, [position])
+
+    def for_user(self, saved_anime_ids: Set, k: int = 12) -> List:
+        '''
+        Ids of the k animes closest to everything in `saved_anime_ids`.
+        Users with nothing to go on get the most saved animes instead.
+        '''
+        self._check_for_update()
+        with self._lock:
+            saved = [
+                self._positions[anime_id] for anime_id in saved_anime_ids
+                if anime_id in self._positions
+            ]
+            recommended = self._top(self._scores(saved), k, saved)
+            if recommended:
+                return recommended
+
+            return self._top(self._counts.astype(np.float64), k, saved)
+
+
+recommender = CoOccurrenceRecommender(RECOMMENDER_SYNC_INTERVAL)
@@ -1,5 +1,7 @@
 import os
-import requests
+from typing import Dict
+
+from helpers import http_client
 
 
 class SendInBlueError(Exception):
@@ -12,74 +14,49 @@ class SendInBlueError(Exception):
 
 
 class SendInBlue:
-    SEND_EMAIL_ENDPOINT = "https://api.sendinblue.com/v3/smtp/email"
+    # can be pointed to a local stand-in of the API, e.g. while testing the mail worker
+    SEND_EMAIL_ENDPOINT = os.environ.get("SENDINBLUE_API_URL") or \
+        "https://api.sendinblue.com/v3/smtp/email"
     API_KEY = os.environ.get("SENDINBLUE_API_KEY")
     MAIL_NOT_SENT_ERROR = "SendInBlue response status is not 201. Email not sent."
     REQUEST_ERROR = "Error occurred during SendInBlue API request."
 
     @classmethod
-    def send_activation_email(cls, **kwargs) -> None:
-        payload = {
+    def _template_payload(cls, template_id: int, email: str, name: str, params: Dict) -> Dict:
+        return {
             "sender": {
                 "name": "MyanNime",
                 "email": "noreply@myannime.com"
             },
             "to": [
                 {
-                    "email": kwargs["email"],
-                    "name": kwargs["name"]
+                    "email": email,
+                    "name": name
                 }
             ],
-            "params": {
-                "NAME": kwargs["name"],
-                "ACTIVATION_LINK": kwargs["activation_link"]
-            },
-            "templateId": 1
-        }
-        headers = {
-            "accept": "application/json",
-            "content-type": "application/json",
-            "api-key": cls.API_KEY
+            "params": params,
+            "templateId": template_id
         }
 
-        try:
-            response = requests.request(
-                "POST",
-                cls.SEND_EMAIL_ENDPOINT,
-                json=payload,
-                headers=headers
-            )
-
-            print(response.status_code)
-            if response.status_code != 201:
-                raise SendInBlueError(cls.MAIL_NOT_SENT_ERROR)
-
-            print(response.text)
+    @classmethod
+    def activation_email(cls, **kwargs) -> Dict:
+        '''Builds the payload of an activation email.'''
+        return cls._template_payload(1, kwargs["email"], kwargs["name"], {
+            "NAME": kwargs["name"],
+            "ACTIVATION_LINK": kwargs["activation_link"]
+        })
 
-        except Exception as ex:
-            print(ex)
-            raise SendInBlueError(cls.REQUEST_ERROR)
+    @classmethod
+    def pw_reset_email(cls, **kwargs) -> Dict:
+        '''Builds the payload of a password reset email.'''
+        return cls._template_payload(2, kwargs["email"], kwargs["name"], {
+            "NAME": kwargs["name"],
+            "PW_RESET_LINK": kwargs["pw_reset_link"]
+        })
 
     @classmethod
-    def send_pw_reset_email(cls, **kwargs) -> None:
-        # The code is not dry! Re UPDATE IT!!
-        payload = {
-            "sender": {
-                "name": "MyanNime",
-                "email": "noreply@myannime.com"
-            },
-            "to": [
-                {
-                    "email": kwargs["email"],
-                    "name": kwargs["name"]
-                }
-            ],
-            "params": {
-                "NAME": kwargs["name"],
-                "PW_RESET_LINK": kwargs["pw_reset_link"]
-            },
-            "templateId": 2
-        }
+    def send(cls, payload: Dict) -> None:
+        '''Sends a payload built by one of the methods above. Raises SendInBlueError.'''
         headers = {
             "accept": "application/json",
             "content-type": "application/json",
@@ -87,19 +64,25 @@ class SendInBlue:
         }
 
         try:
-            response = requests.request(
+            response = http_client.request(
                 "POST",
                 cls.SEND_EMAIL_ENDPOINT,
                 json=payload,
                 headers=headers
             )
 
-            print(response.status_code)
-            if response.status_code != 201:
-                raise SendInBlueError(cls.MAIL_NOT_SENT_ERROR)
-
-            print(response.text)
-
         except Exception as ex:
             print(ex)
             raise SendInBlueError(cls.REQUEST_ERROR)
+
+        if response.status_code != 201:
+            print(response.status_code, response.text)
+            raise SendInBlueError(cls.MAIL_NOT_SENT_ERROR)
+
+    @classmethod
+    def send_activation_email(cls, **kwargs) -> None:
+        cls.send(cls.activation_email(**kwargs))
+
+    @classmethod
+    def send_pw_reset_email(cls, **kwargs) -> None:
+        cls.send(cls.pw_reset_email(**kwargs))
@@ -1,18 +1,66 @@
 import os
-import requests
 import json
-import datetime
+import threading
+from time import monotonic
+from typing import BinaryIO, Dict
+
+from helpers import http_client
+
+
+class SirvError(Exception):
+    def __init__(self, message):
+        self.message = message
+        super().__init__(self.message)
+
+    def __str__(self):
+        return self.message
+
+
+class _ChunkedReader:
+    '''
+    Wraps a seekable binary stream so requests sends it in chunks
+    (with a Content-Length).
+    '''
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, stream: BinaryIO):
+        self._stream = stream
+        self._start = stream.tell()
+        stream.seek(0, os.SEEK_END)
+        self.len = stream.tell() - self._start  # read by requests for Content-Length
+        stream.seek(self._start)
+
+    def read(self, size: int = -1) -> bytes:
+        # never hand the whole file over at once
+        if size is None or size < 0:
+            size = self.CHUNK_SIZE
+        return self._stream.read(size)
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> None:
+        '''Only rewinding to the start is supported, e.g. to retry an upload.'''
+        self._stream.seek(self._start)
 
 
 class Sirv():
+    AUTH_URI = 'https://api.sirv.com/v2/token'
+    UPLOAD_FAILED_ERROR = "Sirv response status is not 200. Image not uploaded."
+    DELETE_FAILED_ERROR = "Sirv response status is not 200. Image not deleted."
+    TOKEN_LIFETIME = 1200  # seconds, used when Sirv doesn't tell us
+    TOKEN_REFRESH_MARGIN = 60  # refresh this many seconds before expiry
+
     def __init__(self, client_id, client_secret):
         self.client_id = client_id
         self.client_secret = client_secret
+        self._token = None
+        self._token_expires_at = 0
+        self._token_lock = threading.Lock()
 
-    @property
-    def get_auth_token(self):
+    def _token_is_fresh(self) -> bool:
+        return self._token is not None and \
+            monotonic() < self._token_expires_at - self.TOKEN_REFRESH_MARGIN
+
+    def _request_token(self):
         print("Getting auth token...")
-        AUTH_URI = 'https://api.sirv.com/v2/token'
         headers = {
             'content-type': 'application/json',
         }
@@ -20,53 +68,94 @@ class Sirv():
             'clientId': self.client_id,
             'clientSecret': self.client_secret
         }
-        r = requests.post(AUTH_URI, headers=headers, data=json.dumps(data))
+        r = http_client.request(
+            "POST", self.AUTH_URI, headers=headers, data=json.dumps(data))
 
         if r.status_code == 200:
-            now = datetime.datetime.now()
-            time_expires = now + datetime.timedelta(seconds=1200)
-            time_expires = int(time_expires.timestamp())
+            body = r.json()
+            expires_in = body.get('expiresIn', self.TOKEN_LIFETIME)
             print("Auth token attained...")
-            return r.json()['token']
+            return body['token'], monotonic() + expires_in
 
-        return None
+        return None, 0
 
-    def upload(self, file_name, file_path, sirv_folder_name):
+    @property
+    def get_auth_token(self):
+        '''
+        Returns a cached token and fetches a new one shortly before it expires.
+        Only one thread per process requests a token, the others wait for it.
+        '''
+        if self._token_is_fresh():
+            return self._token
+
+        with self._token_lock:
+            # another thread may have refreshed it while we were waiting
+            if not self._token_is_fresh():
+                self._token, self._token_expires_at = self._request_token()
+
+            return self._token
+
+    def _invalidate_auth_token(self, token) -> None:
+        with self._token_lock:
+            if self._token == token:
+                self._token = None
+
+    def _authorized_post(self, uri, **kwargs):
+        '''POSTs with the cached token. A 401 costs one re-auth and one retry.'''
+        headers = kwargs.pop('headers', {})
+        for attempt in range(2):
+            auth_token = self.get_auth_token
+            headers['authorization'] = f'Bearer {auth_token}'
+            r = http_client.request("POST", uri, headers=headers, **kwargs)
+
+            if r.status_code != 401 or attempt:
+                return r
+
+            print("Sirv token rejected, re-authenticating...")
+            self._invalidate_auth_token(auth_token)
+            payload = kwargs.get('data', None)
+            if hasattr(payload, 'seek'):
+                payload.seek(0)
+
+    def upload_stream(self, stream: BinaryIO, file_name: str, sirv_folder_name: str) -> Dict:
+        '''
+        Streams a seekable binary stream (e.g. FileStorage.stream) to Sirv
+        chunk by chunk. Nothing is written to disk.
+        Raises SirvError when Sirv does not accept the file.
+        '''
         URI = 'https://api.sirv.com/v2/files/upload'
 
-        auth_token = self.get_auth_token
         querystring = {'filename': f"/{sirv_folder_name}/{file_name}"}
-        file_location = f'{file_path}/{file_name}'
-        payload = open(file_location, 'rb')
+        payload = _ChunkedReader(stream)
         headers = {
             'content-type': 'application/json',
-            'authorization': f'Bearer {auth_token}'
         }
 
-        r = requests.post(
+        r = self._authorized_post(
             URI, data=payload, headers=headers, params=querystring)
 
-        if r.status_code == 200:
-            print("Upload to sirv done. Removing local file...")
-            os.remove(file_location)
+        if r.status_code != 200:
+            print(r.status_code, r.text)
+            raise SirvError(self.UPLOAD_FAILED_ERROR)
 
+        print("Upload to sirv done...")
         return {
-            "image_path": f"https://veherthb.sirv.com/{sirv_folder_name}/{file_name}",
+            "image_path": f"https://veherthb.sirv.com/{sirv_folder_name}/{file_name}"
         }
 
     def delete(self, file_name, sirv_folder_name):
+        '''Raises SirvError when the file could not be deleted.'''
         URI = 'https://api.sirv.com/v2/files/delete'
 
-        auth_token = self.get_auth_token
         querystring = {'filename': f"/{sirv_folder_name}/{file_name}"}
         headers = {
             'content-type': 'application/json',
-            'authorization': f'Bearer {auth_token}'
         }
 
-        r = requests.post(URI, headers=headers, params=querystring)
+        r = self._authorized_post(URI, headers=headers, params=querystring)
 
-        if r.status_code == 200:
-            print("Image from Sirv has been deleted...")
-        else:
-            print("Error removing file...")
+        if r.status_code != 200:
+            print(r.status_code, r.text)
+            raise SirvError(self.DELETE_FAILED_ERROR)
+
+        print("Image from Sirv has been deleted...")
@@ -0,0 +1,27 @@
+'''
+helpers.snapshot
+
+Read-only sessions that see the whole database as of one moment.
+
+Under the default READ COMMITTED every statement sees whatever was committed
+when it started, so several reads that belong together (an index rebuild, a
+change feed batch) can disagree with each other. A REPEATABLE READ session
+takes its snapshot at the first statement and keeps it until it is closed.
+'''
+from contextlib import contextmanager
+
+from sqlalchemy.orm import Session
+
+from db import db
+
+
+@contextmanager
+def snapshot_session():
+    '''A session on its own connection, separate from db.session. Needs an app context.'''
+    connection = db.engine.connect().execution_options(isolation_level="REPEATABLE READ")
+    session = Session(bind=connection)
+    try:
+        yield session
+    finally:
+        session.close()
+        connection.close()
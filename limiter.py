@@ -0,0 +1,37 @@
+import os
+
+from flask_limiter import Limiter
+from flask_limiter.util import get_remote_address
+from flask_jwt_extended import verify_jwt_in_request_optional, get_jwt_identity
+
+# Per-route limits, the more a route costs us the less often it can be hit.
+# Image routes run Pillow/Sirv uploads, auth routes run password hashing.
+HEAVY_LIMIT = os.environ.get("RATELIMIT_HEAVY") or "6/minute"
+AUTH_LIMIT = os.environ.get("RATELIMIT_AUTH") or "10/minute"
+READ_LIMIT = os.environ.get("RATELIMIT_READ") or "2/second"  # same as the default limit
+
+
+def rate_limit_key() -> str:
+    '''
+    Authenticated callers are limited per JWT identity, everyone else per IP.
+    A bad or expired token falls back to the IP, the view itself rejects the token.
+    '''
+    try:
+        verify_jwt_in_request_optional()
+        identity = get_jwt_identity()
+    except Exception:
+        identity = None
+
+    if identity:
+        return f"identity:{identity}"
+
+    return get_remote_address()
+
+
+# Counters live wherever RATELIMIT_STORAGE_URL points to (see default_config).
+# Use a shared store such as redis:// so every gunicorn worker sees the same counters.
+limiter = Limiter(
+    key_func=rate_limit_key,
+    default_limits=["2/second"],
+    headers_enabled=True
+)
@@ -0,0 +1,59 @@
+"""Assign catalog revisions in a trigger
+
+Revision ID: baa6a7db4251
+Revises: c21a595f0f29
+Create Date: 2026-10-18 17:12:44.290613
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'baa6a7db4251'
+down_revision = 'c21a595f0f29'
+branch_labels = None
+depends_on = None
+
+# same as models.CatalogRevision.CATALOG_REVISION_LOCK
+CATALOG_REVISION_LOCK = 0x63617461
+TRIGGERS = (
+    ('anime_info', "INSERT OR UPDATE", "'revision', 'updated_at', 'save_count', 'search_vector'"),
+    ('episodes', "INSERT OR UPDATE", "'revision', 'updated_at'"),
+    ('genres', "INSERT OR UPDATE", "'revision', 'updated_at'"),
+    ('catalog_tombstones', "INSERT", "'revision', 'updated_at'"),
+)
+
+
+def upgrade():
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION catalog_revision_update() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'UPDATE' THEN
+                IF NEW.revision = OLD.revision
+                   AND to_jsonb(NEW) - TG_ARGV = to_jsonb(OLD) - TG_ARGV THEN
+                    RETURN NEW;
+                END IF;
+            END IF;
+
+            PERFORM pg_advisory_xact_lock({CATALOG_REVISION_LOCK});
+            NEW.revision := nextval('catalog_revision_seq');
+            IF TG_OP = 'UPDATE' THEN
+                NEW.updated_at := now();
+            END IF;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    for table, events, arguments in TRIGGERS:
+        op.execute(f"""
+            CREATE TRIGGER {table}_catalog_revision
+            BEFORE {events} ON {table}
+            FOR EACH ROW EXECUTE PROCEDURE catalog_revision_update({arguments})
+        """)
+
+
+def downgrade():
+    for table, _, _ in TRIGGERS:
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_catalog_revision ON {table}")
+    op.execute("DROP FUNCTION IF EXISTS catalog_revision_update()")
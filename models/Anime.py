@@ -1,15 +1,24 @@
-from typing import List
+from typing import List, Tuple
 import uuid
 
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import DDL, event, select, exists, func, literal, any_, all_
+from sqlalchemy.dialects.postgresql import ARRAY, TSVECTOR, UUID, aggregate_order_by, insert as pg_insert
 from sqlalchemy.exc import IntegrityError
 
 from db import db
+from models.CatalogRevision import CatalogRevisionMixin, CatalogTombstoneModel, NEW_REVISION, revision_trigger
+from models.Episode import EpisodeModel
 from models.Genre import GenreModel
 from models.AnimeGenres import anime_genres
+from models.UserAnimes import user_animes
+from helpers.genre_index import genre_index
+from helpers.pagination import cursor_scope, keyset_paginate, KeysetPage
 
+ANIMES_PER_PAGE = 24
+SEARCH_CONFIG = "english"
 
-class AnimeModel(db.Model):
+
+class AnimeModel(CatalogRevisionMixin, db.Model):
     __tablename__ = "anime_info"
 
     anime_id = db.Column(
@@ -22,6 +31,10 @@ class AnimeModel(db.Model):
     synopsis = db.Column(db.Text, nullable=False)
     number_of_episodes = db.Column(db.Integer, nullable=False)
     poster_uri = db.Column(db.String(100), nullable=False)
+    # number of users who saved the anime, kept up to date by UserModel
+    save_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    # weighted title + synopsis document, maintained by a trigger (see below)
+    search_vector = db.deferred(db.Column(TSVECTOR, nullable=True))
     episodes = db.relationship("EpisodeModel", lazy="dynamic")
     genres = db.relationship(
         GenreModel,
@@ -30,6 +43,16 @@ class AnimeModel(db.Model):
         lazy='dynamic',
     )
 
+    # match the listing sort orders, keyset pages seek straight into these
+    __table_args__ = (
+        db.Index('ix_anime_info_title_anime_id', 'title', 'anime_id'),
+        db.Index('ix_anime_info_rating_anime_id', 'rating', 'anime_id'),
+        db.Index('ix_anime_info_save_count_anime_id', 'save_count', 'anime_id'),
+        db.Index('ix_anime_info_search_vector', 'search_vector', postgresql_using='gin'),
+    )
+
+    SORT_METHODS = ("title", "rating", "popular")
+
     @classmethod
     def find_by_name(cls, name: str) -> "AnimeModel":
         return cls.query.filter_by(title=name).first()
@@ -39,36 +62,260 @@ class AnimeModel(db.Model):
         return cls.query.filter_by(anime_id=anime_id).first()
 
     @classmethod
-    def animes_list(cls, page_number: int = 1, sort_method: str = "title") -> List["AnimeModel"]:
+    def genre_names_subquery(cls):
+        '''Sorted genre names of the outer query's anime, as an array.'''
+        return select([
+            func.array_agg(aggregate_order_by(
+                GenreModel.genre_name, GenreModel.genre_name))
+        ]).\
+            select_from(anime_genres.join(GenreModel.__table__)).\
+            where(anime_genres.c.anime_id == cls.anime_id).\
+            as_scalar()
+
+    @classmethod
+    def episodes_subquery(cls):
+        '''Episode ids and numbers of the outer query's anime, as a json array.'''
+        return select([
+            func.json_agg(aggregate_order_by(
+                func.json_build_object(
+                    "episode_id", EpisodeModel.episode_id,
+                    "episode_number", EpisodeModel.episode_number
+                ),
+                EpisodeModel.episode_number
+            ))
+        ]).\
+            where(EpisodeModel.anime_id == cls.anime_id).\
+            as_scalar()
+
+    @classmethod
+    def find_details_by_id(cls, anime_id: str, user_id=None) -> Tuple or None:
+        '''
+        Loads everything the anime detail page needs in a single statement.
+        Returns (anime, genre names, episodes, bookmarked) or None.
+        user_id can be a value or a scalar subquery; bookmarked is False without it.
+        '''
+        genre_names = cls.genre_names_subquery()
+        episodes = cls.episodes_subquery()
+
+        if user_id is None:
+            bookmarked = literal(False)
+        else:
+            bookmarked = exists().\
+                where(user_animes.c.anime_id == cls.anime_id).\
+                where(user_animes.c.user_id == user_id)
+
+        details = db.session.\
+            query(cls, genre_names, episodes, bookmarked).\
+            filter(cls.anime_id == anime_id).\
+            first()
+
+        if details:
+            anime, genre_names, episodes, bookmarked = details
+            return anime, genre_names or [], episodes or [], bool(bookmarked)
+
+        return None
+
+    @classmethod
+    def export_rows(cls, batch_size: int = 500):
+        '''
+        Every anime with its genres and episodes, ordered by anime_id.
+        Rows are plain tuples fetched batch_size at a time from a server side
+        cursor, nothing is kept in the session, so memory use stays flat.
+        '''
+        return db.session.\
+            query(
+                cls.anime_id, cls.title, cls.rating, cls.release, cls.status,
+                cls.synopsis, cls.number_of_episodes, cls.poster_uri, cls.save_count,
+                cls.genre_names_subquery().label("genres"),
+                cls.episodes_subquery().label("episodes")
+            ).\
+            order_by(cls.anime_id).\
+            yield_per(batch_size)
+
+    @classmethod
+    def listing_columns(cls) -> Tuple:
+        '''Columns of an anime in listings, the same in page and cursor mode.'''
+        return cls.anime_id, cls.title, cls.poster_uri, cls.rating, cls.save_count
+
+    @classmethod
+    def animes_list(cls, page_number: int = 1, sort_by: str = "title") -> List["AnimeModel"]:
         return cls.\
             query.\
-            with_entities(cls.anime_id, cls.title, cls.poster_uri, cls.rating).\
-            order_by(sort_method).\
-            paginate(page_number, 24, False)
+            with_entities(*cls.listing_columns()).\
+            order_by(*cls.listing_order(sort_by)).\
+            paginate(page_number, ANIMES_PER_PAGE, False)
+
+    @classmethod
+    def list_items_by_ids(cls, anime_ids: List) -> List:
+        '''Listing rows of the given animes, in the order of `anime_ids`. Unknown ids are skipped.'''
+        if not anime_ids:
+            return []
+
+        rows = cls.\
+            query.\
+            with_entities(*cls.listing_columns()).\
+            filter(cls.anime_id.in_(anime_ids)).\
+            all()
+        by_id = {row.anime_id: row for row in rows}
+        return [by_id[anime_id] for anime_id in anime_ids if anime_id in by_id]
+
+    @classmethod
+    def sort_keys(cls, sort_by: str = "title") -> Tuple[List, bool]:
+        '''
+        Returns the columns an anime listing is ordered by and whether the order is descending.
+        anime_id is always the last key so that rows with the same title/rating keep a stable order.
+        '''
+        if sort_by == "rating":
+            return [cls.rating, cls.anime_id], True
+        if sort_by == "popular":
+            return [cls.save_count, cls.anime_id], True
+        return [cls.title, cls.anime_id], False
+
+    @classmethod
+    def listing_order(cls, sort_by: str = "title") -> List:
+        '''
+        ORDER BY of a page mode listing. Every key goes in the same direction,
+        so the (sort key, anime_id) index serves it forwards or backwards.
+        '''
+        keys, descending = cls.sort_keys(sort_by)
+        return [key.desc() if descending else key for key in keys]
+
+    @classmethod
+    def animes_list_by_cursor(cls, cursor: str = None, sort_by: str = "title", query=None) -> KeysetPage:
+        '''
+        Cursor based counterpart of animes_list. Takes an optional base query
+        (e.g. genre.animes) so genre listings are paginated the same way.
+        '''
+        if query is None:
+            query = cls.query
+        keys, descending = cls.sort_keys(sort_by)
+        query = query.with_entities(*cls.listing_columns())
+        return keyset_paginate(query, keys, sort_by, cursor, ANIMES_PER_PAGE, descending)
+
+    @classmethod
+    def search(
+        cls,
+        text: str,
+        cursor: str = None,
+        genre_name: str = None,
+        status: str = None
+    ) -> KeysetPage:
+        '''
+        Full text search over titles and synopses, best matches first.
+        Title matches weigh more than synopsis matches.
+        '''
+        ts_query = func.plainto_tsquery(SEARCH_CONFIG, text)
+        rank = func.ts_rank_cd(cls.search_vector, ts_query, type_=db.Float).label("rank")
+        query = db.session.\
+            query(*cls.listing_columns(), rank).\
+            filter(cls.search_vector.op("@@")(ts_query))
+
+        if status:
+            query = query.filter(cls.status == status)
+
+        if genre_name:
+            query = query.filter(exists().where(
+                anime_genres.c.anime_id == cls.anime_id
+            ).where(
+                anime_genres.c.genre_id == GenreModel.genre_id
+            ).where(
+                GenreModel.genre_name == genre_name
+            ))
+
+        # a cursor only pages through the results of the search that handed it out
+        scope = cursor_scope(text, genre_name, status)
+        return keyset_paginate(query, [rank, cls.anime_id], "relevance", cursor, ANIMES_PER_PAGE, True, scope)
+
+    @classmethod
+    def touch(cls, condition) -> None:
+        '''
+        Gives the animes matching `condition` a new revision, for changes outside
+        their own row (genre links). Part of the caller's transaction.
+        '''
+        db.session.execute(
+            cls.__table__.update().
+            where(condition).
+            values(revision=NEW_REVISION)
+        )
+
+    @classmethod
+    def touch_by_genre(cls, genre_id: int) -> None:
+        '''New revision for every anime linked to the genre, e.g. before it is deleted.'''
+        cls.touch(cls.anime_id.in_(
+            select([anime_genres.c.anime_id]).where(anime_genres.c.genre_id == genre_id)
+        ))
+
+    @classmethod
+    def change_save_counts(cls, anime_ids: List, step: int) -> None:
+        '''Adds `step` to the save counters of `anime_ids`. Part of the caller's transaction.'''
+        if anime_ids:
+            db.session.execute(
+                cls.__table__.update().
+                where(cls.anime_id.in_(list(anime_ids))).
+                values(save_count=cls.save_count + step)
+            )
+
+    @classmethod
+    def reconcile_save_counts(cls, batch_size: int = 1000) -> int:
+        '''
+        Recounts save_count from user_animes, batch_size animes per transaction,
+        and fixes the counters that drifted. Returns the number of fixed animes.
+        '''
+        fixed = 0
+        last_id = None
+        while True:
+            batch = db.session.query(cls.anime_id).order_by(cls.anime_id)
+            if last_id is not None:
+                batch = batch.filter(cls.anime_id > last_id)
+            anime_ids = [row.anime_id for row in batch.limit(batch_size)]
+            if not anime_ids:
+                return fixed
+
+            actual = select([func.count(user_animes.c.user_id)]).\
+                where(user_animes.c.anime_id == cls.anime_id).\
+                as_scalar()
+            result = db.session.execute(
+                cls.__table__.update().
+                where(cls.anime_id.in_(anime_ids)).
+                where(cls.save_count != actual).
+                values(save_count=actual)
+            )
+            db.session.commit()
+            fixed += result.rowcount
+            last_id = anime_ids[-1]
 
     @classmethod
     def find_all(cls) -> List["AnimeModel"]:
         return cls.query.all()
 
     def save_to_db(self, new_genres_list: List = []) -> str or None:
+        '''Saves the anime and makes its genres exactly `new_genres_list`, in one transaction.'''
         try:
-            existing_genres = [genre.genre_name for genre in self.genres.all()]
-            # checks if existing genres exist in new genre list
-            for genre in new_genres_list:
-                if not genre in existing_genres:
-                    g = GenreModel.find_by_name(genre)
-                    if g:
-                        self.genres.append(g)
-
-            # checks if existing genres are no longer there in new list
-            for old_genre in existing_genres:
-                if not old_genre in new_genres_list:
-                    g = GenreModel.find_by_name(old_genre)
-                    if g:
-                        self.genres.remove(g)
-
             db.session.add(self)
+            db.session.flush()  # new animes get their anime_id here
+
+            genre_ids = [
+                row.genre_id for row in db.session.
+                query(GenreModel.genre_id).
+                filter(GenreModel.genre_name == any_(literal(list(new_genres_list), ARRAY(db.String))))
+            ]
+            changed_links = db.session.execute(
+                anime_genres.delete().
+                where(anime_genres.c.anime_id == self.anime_id).
+                where(anime_genres.c.genre_id != all_(literal(genre_ids, ARRAY(db.Integer))))
+            ).rowcount
+            if genre_ids:
+                changed_links += db.session.execute(
+                    pg_insert(anime_genres).
+                    values([{"anime_id": self.anime_id, "genre_id": genre_id} for genre_id in genre_ids]).
+                    on_conflict_do_nothing()
+                ).rowcount
+            if changed_links:
+                # the genres are part of the anime in the change feed
+                self.touch(AnimeModel.anime_id == self.anime_id)
+
             db.session.commit()
+            genre_index.invalidate()
             return self.anime_id
         except IntegrityError as error:
             print(f"[Save Anime]: {error}")
@@ -77,8 +324,39 @@ class AnimeModel(db.Model):
     def delete_from_db(self) -> 'sqlalchemy.exc.IntegrityError' or None:
         try:
             db.session.delete(self)
+            CatalogTombstoneModel.record("anime", self.anime_id)
             db.session.commit()
+            genre_index.invalidate()
         except IntegrityError as error:
             print(f"[Delete Anime]: {error}")
             db.session.rollback()
             return error
+
+
+# search_vector is kept current by the database, so every insert and update
+# path (including raw SQL) stays searchable. Migrations create the same trigger.
+SEARCH_VECTOR_TRIGGER = DDL(f"""
+CREATE OR REPLACE FUNCTION anime_info_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(NEW.synopsis, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER anime_info_search_vector_update
+BEFORE INSERT OR UPDATE OF title, synopsis ON anime_info
+FOR EACH ROW EXECUTE PROCEDURE anime_info_search_vector_update();
+""")
+
+event.listen(
+    AnimeModel.__table__,
+    "after_create",
+    SEARCH_VECTOR_TRIGGER.execute_if(dialect="postgresql")
+)
+event.listen(
+    AnimeModel.__table__,
+    "after_create",
+    revision_trigger("anime_info", ("save_count", "search_vector")).execute_if(dialect="postgresql")
+)
@@ -7,11 +7,16 @@ anime_genres = db.Table(
     db.Column(
         "anime_id",
         UUID(as_uuid=True),
-        db.ForeignKey('anime_info.anime_id')
+        db.ForeignKey('anime_info.anime_id'),
+        nullable=False,
+        index=True
     ),
     db.Column(
         "genre_id",
         db.Integer,
-        db.ForeignKey('genres.genre_id')
-    )
+        db.ForeignKey('genres.genre_id'),
+        nullable=False
+    ),
+    # genre first: genre listings are the hot path
+    db.PrimaryKeyConstraint("genre_id", "anime_id")
 )
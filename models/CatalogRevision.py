@@ -0,0 +1,100 @@
+from db import db
+from sqlalchemy import DDL, event, func, literal_column, text
+from sqlalchemy.schema import FetchedValue
+
+# A single counter for the whole catalog. Every insert and update of an anime,
+# episode or genre, and every deletion, takes the next value, so clients can
+# ask for whatever changed after the last revision they have seen.
+catalog_revision = db.Sequence("catalog_revision_seq", metadata=db.metadata)
+NEXT_REVISION = "nextval('catalog_revision_seq')"
+# UPDATE value asking the trigger for a new revision, for changes outside the row (genre links)
+NEW_REVISION = literal_column("DEFAULT")
+CATALOG_REVISION_LOCK = 0x63617461  # pg_advisory_xact_lock key
+
+
+class CatalogRevisionMixin:
+    '''revision and updated_at columns, maintained by the catalog_revision_update trigger.'''
+    revision = db.Column(
+        db.BigInteger,
+        nullable=False,
+        index=True,
+        server_default=text(NEXT_REVISION),
+        server_onupdate=FetchedValue()
+    )
+    updated_at = db.Column(
+        db.DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+        server_onupdate=FetchedValue()
+    )
+
+
+class CatalogTombstoneModel(db.Model):
+    '''Left behind by deleted animes, episodes and genres for the change feed.'''
+    __tablename__ = "catalog_tombstones"
+
+    revision = db.Column(
+        db.BigInteger,
+        primary_key=True,
+        autoincrement=False,
+        server_default=text(NEXT_REVISION)
+    )
+    kind = db.Column(db.String(10), nullable=False)  # anime, episode or genre
+    entity_id = db.Column(db.String(50), nullable=False)
+    deleted_at = db.Column(db.DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    @classmethod
+    def record(cls, kind: str, entity_id) -> None:
+        '''Adds a tombstone to the current transaction, the caller commits.'''
+        db.session.add(cls(kind=kind, entity_id=str(entity_id)))
+
+
+# Revisions are handed out by the database, so that they become visible in
+# order. A revision is only taken while holding CATALOG_REVISION_LOCK, which is
+# released when the transaction ends: a writer can't commit a revision below
+# one that is already visible, and a reader that sees revision N (in one
+# snapshot) sees every revision below N too.
+# The trigger arguments are columns the change feed doesn't carry, updates
+# that only change those (save counters) keep their revision.
+CATALOG_REVISION_FUNCTION = DDL(f"""
+CREATE OR REPLACE FUNCTION catalog_revision_update() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' THEN
+        IF NEW.revision = OLD.revision
+           AND to_jsonb(NEW) - TG_ARGV = to_jsonb(OLD) - TG_ARGV THEN
+            RETURN NEW;
+        END IF;
+    END IF;
+
+    PERFORM pg_advisory_xact_lock({CATALOG_REVISION_LOCK});
+    NEW.revision := {NEXT_REVISION};
+    IF TG_OP = 'UPDATE' THEN
+        NEW.updated_at := now();
+    END IF;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+""")
+
+
+def revision_trigger(table: str, ignored_columns=(), on_update: bool = True) -> DDL:
+    '''The catalog_revision_update trigger for `table`. Migrations create the same.'''
+    events = "INSERT OR UPDATE" if on_update else "INSERT"
+    arguments = ", ".join(f"'{column}'" for column in ("revision", "updated_at") + tuple(ignored_columns))
+    return DDL(f"""
+CREATE TRIGGER {table}_catalog_revision
+BEFORE {events} ON {table}
+FOR EACH ROW EXECUTE PROCEDURE catalog_revision_update({arguments});
+""")
+
+
+event.listen(
+    db.metadata,
+    "before_create",
+    CATALOG_REVISION_FUNCTION.execute_if(dialect="postgresql")
+)
+event.listen(
+    CatalogTombstoneModel.__table__,
+    "after_create",
+    revision_trigger("catalog_tombstones", on_update=False).execute_if(dialect="postgresql")
+)
@@ -1,10 +1,21 @@
+from typing import Tuple
 from db import db
 import uuid
+from sqlalchemy import event, func, select
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
 from sqlalchemy.dialects.postgresql import UUID
 
+from models.CatalogRevision import CatalogRevisionMixin, CatalogTombstoneModel, revision_trigger
 
-class EpisodeModel(db.Model):
+EPISODE_NUMBER_CONSTRAINT = 'uq_episodes_anime_id_episode_number'
+
+
+class EpisodeNumberTaken(Exception):
+    pass
+
+
+class EpisodeModel(CatalogRevisionMixin, db.Model):
     __tablename__ = "episodes"
 
     episode_id = db.Column(
@@ -21,24 +32,73 @@ class EpisodeModel(db.Model):
         nullable=False
     )
 
+    # one episode per number, its index also serves the neighbor lookups
+    __table_args__ = (
+        db.UniqueConstraint('anime_id', 'episode_number',
+                            name=EPISODE_NUMBER_CONSTRAINT),
+    )
+
     @classmethod
     def find_by_id(cls, episode_id) -> "EpisodeModel":
         return cls.query.filter_by(episode_id=episode_id).first()
 
+    @classmethod
+    def find_by_number(cls, anime_id, episode_number: int) -> "EpisodeModel":
+        return cls.query.filter_by(anime_id=anime_id, episode_number=episode_number).first()
+
+    @classmethod
+    def find_with_neighbors(cls, episode_id) -> Tuple or None:
+        '''
+        Loads an episode with the ids of the episodes before and after it,
+        in a single statement. Returns (episode, prev_episode, next_episode) or None.
+        '''
+        current = aliased(cls)
+        anime_episodes = db.session.\
+            query(
+                cls.episode_id,
+                func.lag(cls.episode_id).over(order_by=cls.episode_number).label("prev_episode"),
+                func.lead(cls.episode_id).over(order_by=cls.episode_number).label("next_episode")
+            ).\
+            filter(cls.anime_id == select([current.anime_id]).
+                   where(current.episode_id == episode_id).
+                   as_scalar()).\
+            subquery()
+
+        return db.session.\
+            query(cls, anime_episodes.c.prev_episode, anime_episodes.c.next_episode).\
+            join(anime_episodes, anime_episodes.c.episode_id == cls.episode_id).\
+            filter(cls.episode_id == episode_id).\
+            first()
+
     def save_to_db(self) -> str or None:
+        '''
+        Returns the episode_id, None when the anime doesn't exist.
+        Raises EpisodeNumberTaken when the anime has an episode with that number,
+        e.g. one saved concurrently after the caller checked.
+        '''
         try:
             db.session.add(self)
             db.session.commit()
             return self.episode_id
         except IntegrityError as error:
-            print(f"[Save Episode]: {error}")
             db.session.rollback()
+            if getattr(error.orig.diag, "constraint_name", None) == EPISODE_NUMBER_CONSTRAINT:
+                raise EpisodeNumberTaken(self.episode_number)
+            print(f"[Save Episode]: {error}")
 
     def delete_from_db(self) -> None or 'sqlalchemy.exc.IntegrityError':
         try:
             db.session.delete(self)
+            CatalogTombstoneModel.record("episode", self.episode_id)
             db.session.commit()
         except IntegrityError as error:
             print(f"[Delete Episode]: {error}")
             db.session.rollback()
             return error
+
+
+event.listen(
+    EpisodeModel.__table__,
+    "after_create",
+    revision_trigger("episodes").execute_if(dialect="postgresql")
+)
@@ -1,8 +1,11 @@
 from db import db
+from sqlalchemy import event
 from sqlalchemy.exc import IntegrityError
 
+from models.CatalogRevision import CatalogRevisionMixin, CatalogTombstoneModel, revision_trigger
 
-class GenreModel(db.Model):
+
+class GenreModel(CatalogRevisionMixin, db.Model):
     __tablename__ = 'genres'
     genre_id = db.Column(db.Integer, primary_key=True)
     genre_name = db.Column(db.String(50), unique=True, nullable=False)
@@ -30,8 +33,16 @@ class GenreModel(db.Model):
     def delete_from_db(self) -> 'sqlalchemy.exc.IntegrityError' or None:
         try:
             db.session.delete(self)
+            CatalogTombstoneModel.record("genre", self.genre_name)
             db.session.commit()
         except IntegrityError as error:
             print(f"[Delete Genre]: {error}")
             db.session.rollback()
             return error
+
+
+event.listen(
+    GenreModel.__table__,
+    "after_create",
+    revision_trigger("genres").execute_if(dialect="postgresql")
+)
@@ -0,0 +1,97 @@
+from typing import Tuple
+
+from sqlalchemy.dialects.postgresql import insert
+
+from db import db
+
+
+class ImageBeingDeleted(Exception):
+    pass
+
+
+class ImageBlobModel(db.Model):
+    '''
+    Content addressed index of the images uploaded to Sirv.
+    Identical bytes are stored once, ref_count tracks how many uploads point to them.
+    While the file is being deleted from Sirv the row is pending_delete and takes
+    no new references.
+    '''
+    __tablename__ = 'image_blobs'
+
+    sha256 = db.Column(db.String(64), primary_key=True)
+    file_name = db.Column(db.String(100), nullable=False, unique=True)
+    image_url = db.Column(db.String(200), nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=1)
+    pending_delete = db.Column(db.Boolean, nullable=False, default=False, server_default=db.text("false"))
+
+    @classmethod
+    def add_reference(cls, sha256: str) -> Tuple[str, str] or None:
+        '''
+        Counts one more upload of known bytes.
+        Returns their (file_name, image_url), None if the bytes are unknown.
+        '''
+        row = db.session.execute(
+            cls.__table__.update().
+            where(cls.sha256 == sha256).
+            where(~cls.pending_delete).
+            values(ref_count=cls.ref_count + 1).
+            returning(cls.file_name, cls.image_url)
+        ).first()
+        db.session.commit()
+        return tuple(row) if row else None
+
+    @classmethod
+    def register(cls, sha256: str, file_name: str, image_url: str) -> Tuple[str, str]:
+        '''
+        Records freshly uploaded bytes and returns their (file_name, image_url).
+        Two concurrent uploads of the same bytes both end up here,
+        the second one only adds a reference.
+        Raises ImageBeingDeleted when the bytes are pending deletion.
+        '''
+        statement = insert(cls.__table__).\
+            values(sha256=sha256, file_name=file_name, image_url=image_url, ref_count=1)
+        statement = statement.on_conflict_do_update(
+            index_elements=[cls.sha256],
+            set_={"ref_count": cls.__table__.c.ref_count + 1},
+            where=~cls.__table__.c.pending_delete
+        ).returning(cls.file_name, cls.image_url)
+        row = db.session.execute(statement).first()
+        db.session.commit()
+        if row is None:
+            raise ImageBeingDeleted(file_name)
+        return tuple(row)
+
+    @classmethod
+    def lock_by_file_name(cls, file_name: str) -> "ImageBlobModel":
+        '''Row is locked until commit so no upload can add a reference meanwhile.'''
+        return cls.query.filter_by(file_name=file_name).with_for_update().first()
+
+    @classmethod
+    def unlock(cls) -> None:
+        '''Lets go of a row lock_by_file_name took, without changing anything.'''
+        db.session.rollback()
+
+    def save_to_db(self) -> None:
+        db.session.add(self)
+        db.session.commit()
+
+    def mark_pending_delete(self) -> None:
+        '''Commits the row as pending deletion, which also lets go of its lock.'''
+        self.pending_delete = True
+        db.session.commit()
+
+    @classmethod
+    def cancel_delete(cls, file_name: str) -> None:
+        '''The remote file is still there, the bytes can be referenced again.'''
+        cls.query.\
+            filter_by(file_name=file_name, pending_delete=True).\
+            update({"pending_delete": False}, synchronize_session=False)
+        db.session.commit()
+
+    @classmethod
+    def finish_delete(cls, file_name: str) -> None:
+        '''Drops the row once the remote file is gone.'''
+        cls.query.\
+            filter_by(file_name=file_name, pending_delete=True).\
+            delete(synchronize_session=False)
+        db.session.commit()
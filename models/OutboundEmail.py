@@ -0,0 +1,87 @@
+from time import time
+from typing import Dict, List
+
+from db import db
+
+MAIL_MAX_ATTEMPTS = 8
+MAIL_RETRY_BASE_DELAY = 30  # seconds, doubled after every failed attempt
+MAIL_RETRY_MAX_DELAY = 3600  # 1 hr
+MAIL_LEASE = 300  # seconds a claimed email is left alone before it is retried
+
+
+class OutboundEmailModel(db.Model):
+    '''
+    Emails waiting to be handed over to SendInBlue.
+    Rows are written by the request handlers and drained by the mail worker.
+    '''
+    __tablename__ = 'outbound_emails'
+
+    email_id = db.Column(db.Integer, primary_key=True)
+    payload = db.Column(db.JSON, nullable=False)
+    status = db.Column(db.String(10), nullable=False)  # pending, sent or failed
+    attempts = db.Column(db.Integer, nullable=False)
+    next_attempt_at = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.Integer, nullable=False)
+    last_error = db.Column(db.Text, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_outbound_emails_status_next_attempt_at',
+                 'status', 'next_attempt_at'),
+    )
+
+    def __init__(self, payload: Dict, **kwargs):
+        super().__init__(**kwargs)
+        self.payload = payload
+        self.status = 'pending'
+        self.attempts = 0
+        self.created_at = int(time())
+        self.next_attempt_at = self.created_at
+
+    @classmethod
+    def claim_due(cls, batch_size: int) -> List['OutboundEmailModel']:
+        '''
+        Claims a batch of emails that are due for sending and commits, so that
+        nothing stays locked while they are sent. A claim counts as an attempt
+        and pushes next_attempt_at MAIL_LEASE seconds ahead: an email whose
+        worker died while sending it is retried after that, and given up on
+        after MAIL_MAX_ATTEMPTS like any other failure.
+        SKIP LOCKED lets several workers claim at the same time without overlap.
+        '''
+        now = int(time())
+        emails = cls.query.\
+            filter(cls.status == 'pending', cls.next_attempt_at <= now).\
+            order_by(cls.next_attempt_at).\
+            limit(batch_size).\
+            with_for_update(skip_locked=True).\
+            all()
+
+        claimed = []
+        for email in emails:
+            if email.attempts >= MAIL_MAX_ATTEMPTS:
+                email.status = 'failed'
+                continue
+            email.attempts += 1
+            email.next_attempt_at = now + MAIL_LEASE
+            claimed.append(email)
+
+        db.session.commit()
+        return claimed
+
+    def mark_sent(self) -> None:
+        self.status = 'sent'
+        self.last_error = None
+
+    def mark_failed(self, error: str) -> None:
+        '''Schedules a retry with exponential backoff or gives up after MAIL_MAX_ATTEMPTS.'''
+        self.last_error = error
+        if self.attempts >= MAIL_MAX_ATTEMPTS:
+            self.status = 'failed'
+            return
+
+        delay = min(MAIL_RETRY_BASE_DELAY * 2 ** (self.attempts - 1),
+                    MAIL_RETRY_MAX_DELAY)
+        self.next_attempt_at = int(time()) + delay
+
+    def save_to_db(self) -> None:
+        db.session.add(self)
+        db.session.commit()
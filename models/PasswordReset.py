@@ -11,7 +11,7 @@ class PasswordResetModel(db.Model):
 
     password_reset_id = db.Column(db.String(50), primary_key=True)
     expires_at = db.Column(db.Integer, nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('users._id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users._id'), nullable=False, index=True)
     user = db.relationship('UserModel')
 
     def __init__(self, user_id: int, **kwargs):
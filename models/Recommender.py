@@ -0,0 +1,70 @@
+from typing import List, Set, Tuple
+
+from sqlalchemy import func, text
+from sqlalchemy.dialects.postgresql import ARRAY, UUID
+
+from db import db
+
+
+class RecommenderArtifactModel(db.Model):
+    '''
+    The co-occurrence matrix built by `flask build-recommender`, as an npz file.
+    Stored in the database so that every dyno loads the same one.
+    '''
+    __tablename__ = 'recommender_artifacts'
+
+    artifact_id = db.Column(db.Integer, primary_key=True)
+    # txid_current_snapshot() of the transaction the matrix was read in
+    snapshot = db.Column(db.Text, nullable=False)
+    data = db.Column(db.LargeBinary, nullable=False)
+    built_at = db.Column(db.DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    @classmethod
+    def save(cls, snapshot: str, data: bytes) -> int:
+        '''
+        Stores a new artifact and drops the older ones along with the changes
+        the previous artifact already contained. Returns the new artifact_id.
+        '''
+        previous = db.session.query(cls.snapshot).order_by(cls.artifact_id.desc()).first()
+        artifact = cls(snapshot=snapshot, data=data)
+        db.session.add(artifact)
+        db.session.flush()
+        cls.query.filter(cls.artifact_id < artifact.artifact_id).delete(synchronize_session=False)
+        if previous:
+            # workers still on the previous artifact don't need these either
+            RecommenderChangeModel.query.\
+                filter(RecommenderChangeModel.txid < func.txid_snapshot_xmin(previous.snapshot)).\
+                delete(synchronize_session=False)
+        db.session.commit()
+        return artifact.artifact_id
+
+
+class RecommenderChangeModel(db.Model):
+    '''
+    Changes of users' saved animes, written in the same transaction as the change.
+    Workers replay the ones their artifact doesn't contain yet.
+    '''
+    __tablename__ = 'recommender_changes'
+
+    change_id = db.Column(db.BigInteger, primary_key=True)
+    txid = db.Column(db.BigInteger, nullable=False, index=True, server_default=text("txid_current()"))
+    saved_before = db.Column(ARRAY(UUID(as_uuid=True)), nullable=False)
+    saved_after = db.Column(ARRAY(UUID(as_uuid=True)), nullable=False)
+
+    @classmethod
+    def record(cls, before: Set, after: Set) -> None:
+        '''Adds a change to the current transaction, the caller commits.'''
+        db.session.add(cls(saved_before=list(before), saved_after=list(after)))
+
+    @classmethod
+    def not_visible_in(cls, session, snapshot: str) -> List[Tuple[Set, Set]]:
+        '''
+        (before, after) of the changes committed after `snapshot` was taken,
+        as far as `session` can see them, oldest first.
+        '''
+        rows = session.\
+            query(cls.saved_before, cls.saved_after).\
+            filter(cls.txid >= func.txid_snapshot_xmin(snapshot)).\
+            filter(~func.txid_visible_in_snapshot(cls.txid, snapshot)).\
+            order_by(cls.change_id)
+        return [(set(before), set(after)) for before, after in rows]
@@ -1,13 +1,22 @@
 from datetime import datetime, timezone
+import uuid
 
 from db import db
 from models.Anime import AnimeModel
 from models.UserAnimes import user_animes
 from models.UserConfirmation import ConfirmationModel
 from models.PasswordReset import PasswordResetModel
+from models.Recommender import RecommenderChangeModel
+from sqlalchemy import and_, any_, exists, literal, select
+from sqlalchemy.dialects.postgresql import ARRAY, UUID, insert as pg_insert
 from sqlalchemy.exc import IntegrityError
 
 
+def _uuid_array(values: list):
+    '''A single uuid[] parameter, so the statement doesn't grow with the list.'''
+    return literal(values, ARRAY(UUID(as_uuid=True)))
+
+
 class UserModel(db.Model):
     __tablename__ = "users"
 
@@ -52,13 +61,72 @@ class UserModel(db.Model):
     def find_by_email(cls, email: str) -> "UserModel":
         return cls.query.filter_by(email=email).first()
 
-    def save_anime(self, anime_id: str) -> bool:
+    @classmethod
+    def find_columns(cls, columns, user_id: int = None, username: str = None):
+        '''Loads only the given columns of a user, by id when known and by username otherwise.'''
+        query = db.session.query(*columns)
+        if user_id is not None:
+            query = query.filter(cls._id == user_id)
+        else:
+            query = query.filter(cls.username == username)
+        return query.first()
+
+    @classmethod
+    def saved_animes_list(cls, user_id: int) -> list:
+        '''Rows of (anime_id, title, poster_uri) in user's collection, ordered by title.'''
+        return db.session.\
+            query(AnimeModel.anime_id, AnimeModel.title, AnimeModel.poster_uri).\
+            join(user_animes, user_animes.c.anime_id == AnimeModel.anime_id).\
+            filter(user_animes.c.user_id == user_id).\
+            order_by(AnimeModel.title).\
+            all()
+
+    @classmethod
+    def saved_anime_ids(cls, user_id: int) -> set:
+        return {
+            row[0] for row in db.session.execute(
+                select([user_animes.c.anime_id]).
+                where(user_animes.c.user_id == user_id)
+            )
+        }
+
+    @classmethod
+    def _record_recommender_change(cls, user_id: int, gained=(), lost=()) -> None:
+        '''Logs a change of user's collection for the recommender, part of the caller's transaction.'''
+        if not gained and not lost:
+            return
+        gained = {uuid.UUID(str(anime_id)) for anime_id in gained}
+        lost = {uuid.UUID(str(anime_id)) for anime_id in lost}
+        after = cls.saved_anime_ids(user_id)
+        before = (after - gained) | lost
+        RecommenderChangeModel.record(before, after)
+
+    @classmethod
+    def update_password(cls, user_id: int, password_hash: str) -> bool:
+        try:
+            updated = cls.query.\
+                filter_by(_id=user_id).\
+                update({"password": password_hash}, synchronize_session=False)
+            db.session.commit()
+            return updated > 0
+        except Exception as ex:
+            print(ex)
+            db.session.rollback()
+            return False
+
+    @classmethod
+    def save_anime(cls, user_id: int, anime_id: str) -> bool:
         '''Saves an anime to user's collection.'''
         try:
-            anime = AnimeModel.find_by_id(anime_id)
-            if anime:
-                self.saved_animes.append(anime)
-                db.session.add(self)
+            anime_exists = db.session.query(
+                exists().where(AnimeModel.anime_id == anime_id)
+            ).scalar()
+            if anime_exists:
+                db.session.execute(
+                    user_animes.insert().values(user_id=user_id, anime_id=anime_id)
+                )
+                AnimeModel.change_save_counts([anime_id], 1)
+                cls._record_recommender_change(user_id, gained=[anime_id])
                 db.session.commit()
                 return True
             return False
@@ -67,29 +135,100 @@ class UserModel(db.Model):
             db.session.rollback()
             return False
 
-    def remove_anime(self, anime_id: str) -> bool:
+    @classmethod
+    def remove_anime(cls, user_id: int, anime_id: str) -> bool:
         '''Removes an anime from user's collection.'''
         try:
-            anime = AnimeModel.find_by_id(anime_id)
-            if anime:
-                self.saved_animes.remove(anime)
-                db.session.add(self)
-                db.session.commit()
-                return True
-            return False
+            result = db.session.execute(
+                user_animes.delete().where(and_(
+                    user_animes.c.user_id == user_id,
+                    user_animes.c.anime_id == anime_id
+                ))
+            )
+            if result.rowcount > 0:
+                AnimeModel.change_save_counts([anime_id], -1)
+                cls._record_recommender_change(user_id, lost=[anime_id])
+            db.session.commit()
+            return result.rowcount > 0
         except Exception as ex:
             print(ex)
             db.session.rollback()
             return False
 
-    def has_user_saved_anime(self, anime_id: str) -> None or 'AnimeModel':
+    @classmethod
+    def bulk_update_saved_animes(cls, user_id: int, add: list, remove: list) -> dict:
+        '''
+        Adds and removes many animes from user's collection in one transaction.
+        Returns the outcome for every id:
+        added -> saved, already_saved or not_found, removed -> removed or not_saved.
+        '''
+        add = list(dict.fromkeys(add))
+        remove = list(dict.fromkeys(remove))
+        added, removed, known = set(), set(), set()
+        try:
+            if remove:
+                removed = {row[0] for row in db.session.execute(
+                    user_animes.delete().
+                    where(user_animes.c.user_id == user_id).
+                    where(user_animes.c.anime_id == any_(_uuid_array(remove))).
+                    returning(user_animes.c.anime_id)
+                )}
+
+            if add:
+                wanted = AnimeModel.anime_id == any_(_uuid_array(add))
+                known = {row[0] for row in db.session.execute(
+                    select([AnimeModel.anime_id]).where(wanted)
+                )}
+                already_saved = exists().where(and_(
+                    user_animes.c.user_id == user_id,
+                    user_animes.c.anime_id == AnimeModel.anime_id
+                ))
+                added = {row[0] for row in db.session.execute(
+                    pg_insert(user_animes).
+                    from_select(
+                        ["user_id", "anime_id"],
+                        select([literal(user_id), AnimeModel.anime_id]).
+                        where(wanted).
+                        where(~already_saved)
+                    ).
+                    on_conflict_do_nothing().
+                    returning(user_animes.c.anime_id)
+                )}
+
+            AnimeModel.change_save_counts(removed, -1)
+            AnimeModel.change_save_counts(added, 1)
+            cls._record_recommender_change(user_id, gained=added, lost=removed)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        def add_status(anime_id):
+            if anime_id in added:
+                return "saved"
+            return "already_saved" if anime_id in known else "not_found"
+
+        return {
+            "added": {str(anime_id): add_status(anime_id) for anime_id in add},
+            "removed": {
+                str(anime_id): "removed" if anime_id in removed else "not_saved"
+                for anime_id in remove
+            }
+        }
+
+    @classmethod
+    def has_user_saved_anime(cls, user_id: int, anime_id: str) -> bool:
         '''Checks if an anime is in user's collection.'''
         try:
-            anime = self.saved_animes.filter_by(anime_id=anime_id).first()
-            return anime
+            return db.session.query(
+                exists().where(and_(
+                    user_animes.c.user_id == user_id,
+                    user_animes.c.anime_id == anime_id
+                ))
+            ).scalar()
         except Exception as ex:
             print(ex)
-            return None
+            return False
 
     def save_to_db(self) -> str or None:
         try:
@@ -7,11 +7,16 @@ user_animes = db.Table(
     db.Column(
         "anime_id",
         UUID(as_uuid=True),
-        db.ForeignKey("anime_info.anime_id")
+        db.ForeignKey("anime_info.anime_id"),
+        nullable=False,
+        index=True
     ),
     db.Column(
         "user_id",
         db.Integer,
-        db.ForeignKey("users._id")
-    )
+        db.ForeignKey("users._id"),
+        nullable=False
+    ),
+    # user first: lookups go by user far more often than by anime
+    db.PrimaryKeyConstraint("user_id", "anime_id")
 )
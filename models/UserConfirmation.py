@@ -12,7 +12,7 @@ class ConfirmationModel(db.Model):
     confirmation_id = db.Column(db.String(50), primary_key=True)
     expires_at = db.Column(db.Integer, nullable=False)
     confirmed = db.Column(db.Boolean, nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('users._id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users._id'), nullable=False, index=True)
     user = db.relationship('UserModel')
 
     def __init__(self, user_id: int, **kwargs):
@@ -2,10 +2,15 @@ from typing import Dict
 from flask_restful import Resource
 from flask import request
 
-from models.Anime import AnimeModel
+from models.Anime import AnimeModel, ANIMES_PER_PAGE
 from models.Episode import EpisodeModel
 from schemas.Anime import AnimeSchema
 
+from limiter import limiter, READ_LIMIT
+
+from helpers.cache import catalog_cache, catalog_cache_key
+from helpers.genre_index import genre_index, UnknownGenres
+from helpers.pagination import InvalidCursor
 from helpers.strings import get_text
 
 anime_schema = AnimeSchema()
@@ -13,18 +18,42 @@ animes_list_schema = AnimeSchema(many=True)
 
 
 class AnimesList(Resource):
+    decorators = [limiter.limit(READ_LIMIT)]
+
     @classmethod
     def get(cls) -> Dict:
         try:
             page_number = request.args.get("page", 1, type=int)
             sort_by = request.args.get("sort_by", "title", type=str)
+            # presence of the cursor param (even empty) switches to keyset pagination
+            cursor = request.args.get("cursor", None, type=str)
+            # e.g. ?genres=action,slice-of-life&match=any
+            genres = request.args.get("genres", None, type=str)
+            match = request.args.get("match", "all", type=str)
+
+            cache_key = catalog_cache_key(
+                "animes", (genres, match) if genres is not None else None, sort_by, page_number, cursor)
+            cached = catalog_cache.get(cache_key)
+            if cached is not None:
+                return cached, 200
+
+            if genres is not None:
+                return cls.filter_by_genres(genres, match, sort_by, page_number, cache_key)
 
-            if sort_by == "rating":
-                sort_method = AnimeModel.rating.desc()
-            else:
-                sort_method = AnimeModel.title
+            if cursor is not None:
+                sort_by = sort_by if sort_by in AnimeModel.SORT_METHODS else "title"
+                anime = AnimeModel.animes_list_by_cursor(cursor or None, sort_by)
+                anime_list = {
+                    "animes": animes_list_schema.dump(anime.items),
+                    "prev_cursor": anime.prev_cursor,
+                    "next_cursor": anime.next_cursor,
+                    "sorted_by": sort_by
+                }
+                catalog_cache.set(cache_key, anime_list)
 
-            anime = AnimeModel.animes_list(page_number, sort_method)
+                return anime_list, 200
+
+            anime = AnimeModel.animes_list(page_number, sort_by)
             anime_list = {
                 "animes": animes_list_schema.dump(anime.items),
                 "prev_page": anime.prev_num,
@@ -32,10 +61,52 @@ class AnimesList(Resource):
                 "current_page": anime.page,
                 "total_pages": anime.pages
             }
+            catalog_cache.set(cache_key, anime_list)
 
             return anime_list, 200
 
+        except InvalidCursor:
+            return {"message": get_text('pagination_invalid_cursor')}, 400
+
         except Exception as ex:
             print(ex)
 
             return {"message": get_text('server_error_generic')}, 500
+
+    @classmethod
+    def filter_by_genres(cls, genres: str, match: str, sort_by: str, page_number: int, cache_key) -> Dict:
+        '''Animes in all/any of the comma separated genres, served from the genre bitsets.'''
+        # same format as /v1/genre/<genre_name>
+        genre_names = [
+            " ".join(name.strip().split("-")).capitalize()
+            for name in genres.split(",") if name.strip()
+        ]
+        if not genre_names or match not in ("all", "any"):
+            return {"message": get_text('anime_genre_filter_invalid')}, 400
+
+        sort_by = sort_by if sort_by in AnimeModel.SORT_METHODS else "title"
+        page_number = max(page_number, 1)
+
+        try:
+            anime_ids, total, total_pages = genre_index.filter(
+                genre_names, match == "all", sort_by, page_number, ANIMES_PER_PAGE)
+        except UnknownGenres:
+            return {"message": get_text('genre_not_found')}, 404
+
+        anime_list = {
+            # only the page itself is read from the database
+            "animes": animes_list_schema.dump(AnimeModel.list_items_by_ids(anime_ids)),
+            "prev_page": page_number - 1 if page_number > 1 else None,
+            "next_page": page_number + 1 if page_number < total_pages else None,
+            "current_page": page_number,
+            "total_pages": total_pages,
+            "total": total,
+            "genres": genre_names,
+            "match": match,
+            "sorted_by": sort_by
+        }
+        # an index still being rebuilt for the new version must not fill its cache
+        if genre_index.version == cache_key[0]:
+            catalog_cache.set(cache_key, anime_list)
+
+        return anime_list, 200
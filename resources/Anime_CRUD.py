@@ -2,19 +2,20 @@ from typing import Dict
 from flask_restful import Resource
 from flask import request
 from marshmallow.exceptions import ValidationError
-from flask_jwt_extended import jwt_required, get_jwt_claims, jwt_optional, get_jwt_identity
+from flask_jwt_extended import jwt_required, get_jwt_claims, jwt_optional, get_current_user
 
 from models.Anime import AnimeModel
-from models.User import UserModel
 
+from helpers.autocomplete import title_index
+from helpers.cache import bump_catalog_version
 from helpers.check_uuid import valid_uuid4
 from helpers.strings import get_text
 
 from schemas.Anime import AnimeSchema
-from schemas.Episode import EpisodeSchema
 
 anime_info_schema = AnimeSchema()
-episode_schema = EpisodeSchema(many=True)
+# genres come preloaded with the details query
+anime_details_schema = AnimeSchema(exclude=("genres",))
 
 
 class GetAnime(Resource):
@@ -25,26 +26,21 @@ class GetAnime(Resource):
             response = {"message": get_text('anime_uuid_error')}
             return response, 400
 
-        anime = AnimeModel.find_by_id(anime_id)
-        username = get_jwt_identity()
-        anime_bookmarked = False
+        current_user = get_current_user()
+        user_id = None
 
-        if username:  # if there is an authenticated user
-            # get the user and check if he saved the anime
-            user = UserModel.find_by_username(username)
-            if user.has_user_saved_anime(anime_id):
-                anime_bookmarked = True
+        if current_user:  # if there is an authenticated user
+            user_id = current_user.id
 
-        if anime:
-            episodes = anime.\
-                episodes.\
-                with_entities("episode_id", "episode_number").\
-                order_by("episode_number").all()
+        details = AnimeModel.find_details_by_id(anime_id, user_id)
 
+        if details:
+            anime, genres, episodes, anime_bookmarked = details
             anime_data = {
-                **anime_info_schema.dump(anime),
+                **anime_details_schema.dump(anime),
+                "genres": genres,
                 "anime_bookmarked": anime_bookmarked,
-                "episodes": episode_schema.dump(episodes)
+                "episodes": episodes
             }
             return anime_data, 200
 
@@ -70,6 +66,8 @@ class CreateAnime(Resource):
             anime = AnimeModel(**anime_data)
             anime_id = anime.save_to_db(genres_list)
             if anime_id:
+                bump_catalog_version()
+                title_index.upsert(anime_id, anime.title)
                 created_data = {
                     "message": get_text('anime_created'),
                     "anime_id": f"{anime_id}"
@@ -113,6 +111,8 @@ class EditAnime(Resource):
                 anime.poster_uri = anime_data["poster_uri"]
                 anime_id = anime.save_to_db(genres_list)
                 if anime_id:
+                    bump_catalog_version()
+                    title_index.upsert(anime_id, anime.title)
                     return {"message": get_text('anime_updated')}, 200
 
                 # returns an error from model because anime title naming conflict
@@ -122,6 +122,8 @@ class EditAnime(Resource):
             anime = AnimeModel(**anime_data)
             anime_id = anime.save_to_db(genres_list)
             if anime_id:
+                bump_catalog_version()
+                title_index.upsert(anime_id, anime.title)
                 return {"message": get_text('anime_created'), "anime_id": anime_id}, 200
 
             # returns an error from model because anime title naming conflict
@@ -145,6 +147,8 @@ class EditAnime(Resource):
         if anime:
             info = anime.delete_from_db()
             if not info:
+                bump_catalog_version()
+                title_index.remove(anime.anime_id)
                 return {"message": get_text('anime_deleted').format(anime_id=anime_id)}, 200
 
             return {"message": get_text('anime_deletion_error')}, 400
@@ -6,6 +6,8 @@ from flask_jwt_extended import create_access_token, create_refresh_token
 from werkzeug.security import check_password_hash
 from marshmallow.exceptions import ValidationError
 
+from limiter import limiter, AUTH_LIMIT
+
 from models.Admin import AdminModel
 from schemas.Auth import AuthSchema
 
@@ -15,6 +17,8 @@ auth_schema = AuthSchema()
 
 
 class RequestToken(Resource):
+    decorators = [limiter.limit(AUTH_LIMIT)]
+
     @classmethod
     def post(cls):
         try:
@@ -0,0 +1,30 @@
+from typing import Dict
+from flask_restful import Resource
+from flask import request
+
+from limiter import limiter, READ_LIMIT
+
+from helpers.autocomplete import title_index
+from helpers.strings import get_text
+
+DEFAULT_SUGGESTIONS = 8
+MAX_SUGGESTIONS = 20
+MAX_PREFIX_LENGTH = 80
+
+
+class Autocomplete(Resource):
+    decorators = [limiter.limit(READ_LIMIT)]
+
+    @classmethod
+    def get(cls) -> Dict:
+        '''Title suggestions for a search box, e.g. /v1/autocomplete?prefix=atta'''
+        try:
+            prefix = request.args.get("prefix", "", type=str)[:MAX_PREFIX_LENGTH]
+            limit = request.args.get("limit", DEFAULT_SUGGESTIONS, type=int)
+            limit = max(1, min(limit, MAX_SUGGESTIONS))
+
+            return {"suggestions": title_index.suggest(prefix, limit)}, 200
+
+        except Exception as ex:
+            print(ex)
+            return {"message": get_text('server_error_generic')}, 500
@@ -0,0 +1,36 @@
+from typing import Dict
+from flask_restful import Resource
+from flask import request
+
+from limiter import limiter, READ_LIMIT
+
+from helpers.change_feed import changes_since
+from helpers.strings import get_text
+
+DEFAULT_CHANGES = 500
+MAX_CHANGES = 1000
+MAX_REVISION = 2 ** 63 - 1  # revisions are bigint
+
+
+class CatalogChanges(Resource):
+    decorators = [limiter.limit(READ_LIMIT)]
+
+    @classmethod
+    def get(cls) -> Dict:
+        '''Catalog changes after a revision, e.g. /v1/changes?since=1200&limit=500'''
+        try:
+            try:
+                since = int(request.args.get("since", "0", type=str))
+            except ValueError:
+                since = -1
+            if not 0 <= since <= MAX_REVISION:
+                return {"message": get_text('changes_since_invalid')}, 400
+
+            limit = request.args.get("limit", DEFAULT_CHANGES, type=int)
+            limit = max(1, min(limit, MAX_CHANGES))
+
+            return changes_since(since, limit), 200
+
+        except Exception as ex:
+            print(ex)
+            return {"message": get_text('server_error_generic')}, 500
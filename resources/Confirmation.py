@@ -10,7 +10,8 @@ from models.User import UserModel
 
 from schemas.UserConfirm import ConfirmationSchema
 
-from helpers.send_in_blue import SendInBlue, SendInBlueError
+from helpers.mail_queue import queue_email
+from helpers.send_in_blue import SendInBlue
 from helpers.strings import get_text
 
 confirmation_schema = ConfirmationSchema()
@@ -113,21 +114,16 @@ class ResendActivationEmail(Resource):
             new_confirmation.save_to_db()
             token = new_confirmation.confirmation_id
             activation_link = f"{DOMAIN_NAME}/v1/user/activate?token={token}"
-            SendInBlue.send_activation_email(
+            queue_email(SendInBlue.activation_email(
                 name=user.name,
                 email=user.email,
                 activation_link=activation_link
-            )
+            ))
 
             return {
                 "message": get_text('confirmation_resend_activation_email_success')
             }, 200
 
-        except SendInBlueError as err:
-            print(err)
-            new_confirmation.delete_from_db()
-            return {"message": get_text('confirmation_resend_activation_email_failed')}, 500
-
         except Exception as ex:
             print(ex)
             return {
@@ -4,8 +4,9 @@ from flask import request
 from marshmallow.exceptions import ValidationError
 from flask_jwt_extended import jwt_required, get_jwt_claims
 
-from models.Episode import EpisodeModel
+from models.Episode import EpisodeModel, EpisodeNumberTaken
 
+from helpers.cache import bump_catalog_version
 from helpers.check_uuid import valid_uuid4
 from helpers.strings import get_text
 
@@ -21,9 +22,14 @@ class GetEpisode(Resource):
             response = {"message": get_text('episode_uuid_error')}
             return response, 400
 
-        episode = EpisodeModel.find_by_id(episode_id)
-        if episode:
-            episode_data = episode_info_schema.dump(episode)
+        details = EpisodeModel.find_with_neighbors(episode_id)
+        if details:
+            episode, prev_episode, next_episode = details
+            episode_data = {
+                **episode_info_schema.dump(episode),
+                "prev_episode": str(prev_episode) if prev_episode else None,
+                "next_episode": str(next_episode) if next_episode else None
+            }
             return episode_data, 200
 
         return {"message": get_text('episode_not_found').format(episode_id=episode_id)}, 404
@@ -39,9 +45,14 @@ class CreateEpisode(Resource):
                 return {"message": get_text('episode_access_forbidden')}, 403
 
             episode_data = episode_info_schema.load(request.get_json())
+            if EpisodeModel.find_by_number(episode_data["anime_id"], episode_data["episode_number"]):
+                return {"message": get_text('episode_number_exists').format(
+                    episode_number=episode_data["episode_number"])}, 409
+
             episode = EpisodeModel(**episode_data)
             episode_id = episode.save_to_db()
             if episode_id:
+                bump_catalog_version()
                 created_data = {
                     "message": get_text('episode_created'),
                     "episode_id": f"{episode_id}"
@@ -50,6 +61,10 @@ class CreateEpisode(Resource):
 
             return {"message": get_text('episode_anime_not_found').format(anime_id=episode_data["anime_id"])}, 404
 
+        except EpisodeNumberTaken:
+            return {"message": get_text('episode_number_exists').format(
+                episode_number=episode_data["episode_number"])}, 409
+
         except ValidationError as error:
             return {"message": get_text('input_error_generic'), "info": error.messages}, 400
 
@@ -70,22 +85,30 @@ class EditEpisode(Resource):
             episode = EpisodeModel.find_by_id(episode_id)
             if episode:
                 episode_info = episode_info_schema.load(request.get_json())
+                same_number = EpisodeModel.find_by_number(episode_info["anime_id"], episode_info["episode_number"])
+                if same_number and same_number.episode_id != episode.episode_id:
+                    return {"message": get_text('episode_number_exists').format(
+                        episode_number=episode_info["episode_number"])}, 409
+
                 episode.episode_number = episode_info["episode_number"]
                 episode.episode_uri_1 = episode_info.get("episode_uri_1")
                 episode.episode_uri_2 = episode_info.get("episode_uri_2")
                 episode.episode_uri_3 = episode_info.get("episode_uri_3")
                 episode.episode_uri_4 = episode_info.get("episode_uri_4")
-                episode.next_episode = episode_info.get("next_episode")
-                episode.prev_episode = episode_info.get("prev_episode")
                 episode.anime_id = episode_info.get("anime_id")
                 episode_id = episode.save_to_db()
                 if episode_id:
+                    bump_catalog_version()
                     return {"message": get_text('episode_updated')}, 200
 
                 return {"message": get_text('episode_anime_not_found').format(anime_id=episode_info["anime_id"])}, 404
 
             return {"message": get_text('episode_not_found').format(episode_id=episode_id)}, 404
 
+        except EpisodeNumberTaken:
+            return {"message": get_text('episode_number_exists').format(
+                episode_number=episode_info["episode_number"])}, 409
+
         except ValidationError as error:
             return {"message": get_text('input_error_generic'), "info": error.messages}, 400
 
@@ -107,6 +130,7 @@ class EditEpisode(Resource):
             if episode_to_delete:
                 info = episode_to_delete.delete_from_db()
                 if not info:
+                    bump_catalog_version()
                     response_message = {
                         "message": get_text('episode_deleted').format(episode_id=episode_id)
                     }
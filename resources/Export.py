@@ -0,0 +1,68 @@
+import json
+import zlib
+from typing import Iterator
+from flask_restful import Resource
+from flask import request, Response, stream_with_context
+
+from limiter import limiter, HEAVY_LIMIT
+
+from models.Anime import AnimeModel
+from schemas.Anime import AnimeSchema
+
+anime_export_schema = AnimeSchema(exclude=("genres", "genres_list"))
+
+CHUNK_SIZE = 64 * 1024  # bytes of ndjson handed to the compressor at once
+
+
+def catalog_lines() -> Iterator[str]:
+    for row in AnimeModel.export_rows():
+        anime = {
+            **anime_export_schema.dump(row),
+            "genres": row.genres or [],
+            "episodes": row.episodes or []
+        }
+        yield json.dumps(anime, separators=(",", ":")) + "\n"
+
+
+def chunked(lines: Iterator[str]) -> Iterator[bytes]:
+    buffer, size = [], 0
+    for line in lines:
+        encoded = line.encode("utf-8")
+        buffer.append(encoded)
+        size += len(encoded)
+        if size >= CHUNK_SIZE:
+            yield b"".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def gzipped(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+class CatalogExport(Resource):
+    decorators = [limiter.limit(HEAVY_LIMIT)]
+
+    @classmethod
+    def get(cls):
+        '''
+        The whole catalog, one anime per line with its genres and episodes.
+        Streamed as it is read from the database, gzipped when the client accepts it.
+        '''
+        body = chunked(catalog_lines())
+        headers = {"Vary": "Accept-Encoding"}
+        if request.accept_encodings["gzip"]:
+            body = gzipped(body)
+            headers["Content-Encoding"] = "gzip"
+
+        return Response(
+            stream_with_context(body),
+            mimetype="application/x-ndjson",
+            headers=headers
+        )
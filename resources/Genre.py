@@ -9,6 +9,11 @@ from models.Anime import AnimeModel
 from schemas.Genre import GenreSchema
 from schemas.Anime import AnimeSchema
 
+from limiter import limiter, AUTH_LIMIT, READ_LIMIT
+
+from helpers.cache import bump_catalog_version, catalog_cache, catalog_cache_key
+from helpers.genre_index import genre_index
+from helpers.pagination import InvalidCursor
 from helpers.strings import get_text
 
 genre_information_schema = GenreSchema()
@@ -24,19 +29,37 @@ class GenreInfo(Resource):
             genre_name = " ".join(genre_name.split("-")).capitalize()
             page_number = request.args.get("page", 1, type=int)
             sort_by = request.args.get("sort_by", "title", type=str)
+            # presence of the cursor param (even empty) switches to keyset pagination
+            cursor = request.args.get("cursor", None, type=str)
 
-            if sort_by == "rating":
-                sort_method = AnimeModel.rating.desc()
-            else:
-                sort_method = AnimeModel.title
+            cache_key = catalog_cache_key(
+                "genre", genre_name, sort_by, page_number, cursor)
+            cached = catalog_cache.get(cache_key)
+            if cached is not None:
+                return cached, 200
 
             genre = GenreModel.find_by_name(genre_name=genre_name)
+            if genre and cursor is not None:
+                sort_by = sort_by if sort_by in AnimeModel.SORT_METHODS else "title"
+                anime = AnimeModel.animes_list_by_cursor(
+                    cursor or None, sort_by, genre.animes)
+
+                response_data = {
+                    **genre_information_schema.dump(genre),
+                    "animes": animes_list_schema.dump(anime.items),
+                    "prev_cursor": anime.prev_cursor,
+                    "next_cursor": anime.next_cursor,
+                    "sorted_by": sort_by
+                }
+                catalog_cache.set(cache_key, response_data)
+
+                return response_data, 200
+
             if genre:
                 anime = genre.\
                     animes.\
-                    with_entities(AnimeModel.anime_id, AnimeModel.title,
-                                  AnimeModel.poster_uri, AnimeModel.rating).\
-                    order_by(sort_method).\
+                    with_entities(*AnimeModel.listing_columns()).\
+                    order_by(*AnimeModel.listing_order(sort_by)).\
                     paginate(page_number, 24, False)
 
                 response_data = {
@@ -48,11 +71,15 @@ class GenreInfo(Resource):
                     "total_pages": anime.pages,
                     "sorted_by": sort_by
                 }
+                catalog_cache.set(cache_key, response_data)
 
                 return response_data, 200
 
             return {"message": get_text('genre_not_found')}, 404
 
+        except InvalidCursor:
+            return {"message": get_text('pagination_invalid_cursor')}, 400
+
         except Exception as error:
             print(error)
 
@@ -64,11 +91,23 @@ class Genres(Resource):
     PUT: accepts genre_name and genre_explanation to update. creates it if not exists already.
     DELETE: accepts genre_name to be deleted from that genres.
     '''
+    # writes invalidate the caches and the genre index, they get the stricter limit
+    decorators = [
+        limiter.limit(READ_LIMIT, methods=["GET"]),
+        limiter.limit(AUTH_LIMIT, methods=["POST", "PUT", "DELETE"])
+    ]
+
     @classmethod
     def get(cls):
+        cache_key = catalog_cache_key("genres")
+        cached = catalog_cache.get(cache_key)
+        if cached is not None:
+            return cached, 200
+
         genres = GenreModel.get_all_genres()
-        response = genres_list_schema.dump(genres)
-        return {"genres": response}, 200
+        response = {"genres": genres_list_schema.dump(genres)}
+        catalog_cache.set(cache_key, response)
+        return response, 200
 
     @classmethod
     @jwt_required
@@ -83,6 +122,8 @@ class Genres(Resource):
                     genre = GenreModel(**genre_data)
                     genre_id = genre.save_to_db()
                     if genre_id:
+                        bump_catalog_version()
+                        genre_index.invalidate()
                         return {"message": get_text('genre_created')}, 201
 
                     return {"message": get_text('genre_creation_error')}, 500
@@ -108,12 +149,16 @@ class Genres(Resource):
                     genre = GenreModel(**genre_data)
                     genre_id = genre.save_to_db()
                     if genre_id:
+                        bump_catalog_version()
+                        genre_index.invalidate()
                         return {"message": get_text('genre_created')}, 201
 
                     return {"message": get_text('genre_creation_error')}, 500
 
                 genre.genre_explanation = genre_data["genre_explanation"]
                 genre.save_to_db()
+                bump_catalog_version()
+                genre_index.invalidate()
                 return {"message": get_text('genre_updated')}, 200
 
             except Exception as error:
@@ -132,7 +177,11 @@ class Genres(Resource):
 
             if genre:
                 try:
+                    # the animes lose the genre, committed together with the deletion
+                    AnimeModel.touch_by_genre(genre.genre_id)
                     genre.delete_from_db()
+                    bump_catalog_version()
+                    genre_index.invalidate()
                     return {"message": get_text('genre_deleted')}, 200
 
                 except Exception as error:
@@ -1,13 +1,23 @@
 import os
+import mimetypes
 import traceback
+from datetime import datetime
 from flask_restful import Resource
 from flask_uploads import UploadNotAllowed
-from flask import request, send_file
+from flask import request, send_file, Response
+from werkzeug.http import is_resource_modified
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt_claims, jwt_optional
 from marshmallow import ValidationError
+from PIL import UnidentifiedImageError
 
-from helpers import image_helper
-from helpers.sirv import Sirv
+from limiter import limiter, HEAVY_LIMIT
+
+from models.ImageBlob import ImageBlobModel, ImageBeingDeleted
+
+from helpers import image_helper, image_workers
+from helpers.avatar_index import avatar_index, AvatarEntry
+from helpers.image_workers import ImageWorkersBusy, RETRY_AFTER
+from helpers.sirv import Sirv, SirvError
 from helpers.strings import get_text
 
 from schemas.Image import ImageSchema
@@ -20,21 +30,28 @@ client_secret = os.environ.get('SIRV_CLIENT_SECRET', None)
 sirv_utils = Sirv(client_id, client_secret)
 SIRV_BASE_FOLDER_NAME = "MYANNime"
 
+# e.g. /protected-images, lets nginx serve avatars through X-Accel-Redirect.
+# (For X-Sendfile set USE_X_SENDFILE in the flask config instead.)
+AVATAR_ACCEL_REDIRECT_PREFIX = os.environ.get('AVATAR_ACCEL_REDIRECT_PREFIX', None)
+
 
 def authorized():
     '''Checks if admin or not.'''
     role = get_jwt_claims().get("role", None)
-    return role is not None
+    # regular users carry a role claim too
+    return role is not None and role != "Regular Member"
 
 
 class ImageUpload(Resource):
+    decorators = [limiter.limit(HEAVY_LIMIT)]
+
     @classmethod
     @jwt_required
     def post(cls):
         '''
         Used to upload an image file.
-        Uses JWT to retrieve user info and then saves the image to the user's folder.
-        If there is a filename conflict, it appends a number at the end.
+        The upload is streamed straight to Sirv, nothing is kept on our disk.
+        Files are named after their SHA-256, bytes we already have are not uploaded again.
         '''
         if not authorized():
             return {
@@ -44,17 +61,23 @@ class ImageUpload(Resource):
         try:
             # request.files = {"form_fild_name" : 'FileStorage' from werkzeug}
             data = image_schema.load(request.files)
-            user_id = get_jwt_identity()
-            folder = f'admin_{user_id}'  # static/images/user_idxxx
-            image_path = image_helper.save_image(data['image'], folder=folder)
-            basename = image_helper.get_basename(image_path)
-            absolute_path = f'{os.getcwd()}/static/images/{folder}'
-            image_url = sirv_utils.upload(
-                basename, absolute_path, SIRV_BASE_FOLDER_NAME)
+            image = data['image']
+            extension = image_helper.get_extension(
+                image_helper.get_upload_name(image))
+            sha256 = image_helper.get_sha256(image.stream)
+
+            known_image = ImageBlobModel.add_reference(sha256)
+            if known_image:
+                basename, image_url = known_image
+            else:
+                uploaded = sirv_utils.upload_stream(
+                    image.stream, f'{sha256}{extension}', SIRV_BASE_FOLDER_NAME)
+                basename, image_url = ImageBlobModel.register(
+                    sha256, f'{sha256}{extension}', uploaded["image_path"])
 
             return {
                 "message": get_text('image_photo_uploaded').format(basename=basename),
-                "image_url": image_url["image_path"]
+                "image_url": image_url
             }, 201
 
         except UploadNotAllowed:
@@ -66,6 +89,13 @@ class ImageUpload(Resource):
         except ValidationError as error:
             return {"message": get_text('input_error_generic'), "info": error.messages}, 400
 
+        except SirvError as error:
+            print(error)
+            return {"message": get_text('image_upload_failed')}, 502
+
+        except ImageBeingDeleted:
+            return {"message": get_text('image_being_deleted')}, 409
+
         except Exception as ex:
             print(ex)
             return {
@@ -87,32 +117,108 @@ class Image(Resource):
                 "message": get_text('image_illegal_file_name')
             }, 400
 
-        user_id = get_jwt_identity()
-        user_folder = f'admin_{user_id}'
-
         try:
-            sirv_utils.delete(filename, SIRV_BASE_FOLDER_NAME)
+            # images uploaded before content addressing have no blob
+            blob = ImageBlobModel.lock_by_file_name(filename)
+            if blob and blob.ref_count > 1 and not blob.pending_delete:
+                # someone else still uses these bytes, only drop our reference
+                blob.ref_count -= 1
+                blob.save_to_db()
+                return {
+                    "message": get_text('image_deletion_successful')
+                }
+
+            if blob:
+                # released before talking to Sirv, uploads of these bytes
+                # can't reference the row until the deletion is settled
+                blob.mark_pending_delete()
+            else:
+                ImageBlobModel.unlock()
+
+            try:
+                sirv_utils.delete(filename, SIRV_BASE_FOLDER_NAME)
+            except SirvError:
+                if blob:
+                    ImageBlobModel.cancel_delete(filename)
+                raise
+
+            if blob:
+                ImageBlobModel.finish_delete(filename)
+
             return {
                 "message": get_text('image_deletion_successful')
             }
 
+        except SirvError as error:
+            print(error)
+            return {"message": get_text('image_deletion_failed')}, 502
+
         except Exception as ex:
             print(ex)
+            # a row left pending is finished by the next delete of the file
+            ImageBlobModel.unlock()
             return {"message": get_text('image_deletion_failed')}, 500
 
 
+def avatar_response(avatar: AvatarEntry, folder: str, mimetype: str = None) -> Response:
+    '''
+    Answers revalidations with 304 without touching the file,
+    otherwise hands the file over to nginx or sends it ourselves.
+    '''
+    mimetype = mimetype or mimetypes.guess_type(avatar.path)[0]
+    last_modified = datetime.utcfromtimestamp(avatar.mtime)
+    if not is_resource_modified(request.environ, avatar.etag, last_modified=last_modified):
+        response = Response(status=304)
+
+    elif AVATAR_ACCEL_REDIRECT_PREFIX:
+        # variants sit in a folder per size, e.g. 96/user_bob.webp
+        name = os.path.relpath(avatar.path, image_helper.get_folder_path(folder))
+        response = Response(mimetype=mimetype)
+        response.headers['X-Accel-Redirect'] = f'{AVATAR_ACCEL_REDIRECT_PREFIX}/{folder}/{name}'
+
+    else:
+        response = send_file(avatar.path, mimetype=mimetype,
+                              add_etags=False, conditional=False)
+
+    response.set_etag(avatar.etag)
+    response.last_modified = last_modified
+    response.cache_control.no_cache = True  # cache, but revalidate
+    response.vary.add("Accept")
+    return response
+
+
 class AvatarGET(Resource):
     @classmethod
     @jwt_optional
     def get(cls, username: str):
+        '''
+        Serves the stored avatar variant closest to ?size= (px, defaults to 300).
+        WebP goes to clients that explicitly accept it, JPEG to everyone else.
+        '''
         AVATAR_FOLDER = 'avatars' if not authorized() else 'admin_avatars'
         try:
             filename = f'user_{username}'
-            avatar_path = image_helper.find_image_any_format(
-                filename, AVATAR_FOLDER)
-            if avatar_path:
+            folder_path = image_helper.get_folder_path(AVATAR_FOLDER)
+            size = image_helper.pick_avatar_size(
+                request.args.get("size", 300, type=int))
+            accepts_webp = any(
+                mimetype == "image/webp" and quality > 0
+                for mimetype, quality in request.accept_mimetypes
+            )
+            ext = "webp" if accepts_webp else "jpg"
+            avatar = avatar_index.lookup(
+                folder_path, image_helper.avatar_variant_name(filename, size, ext))
+            mimetype = image_helper.AVATAR_MIMETYPES[ext]
+
+            if not avatar:
+                # avatars uploaded before variants existed, user_<username>.<ext>
+                # straight in the folder
+                avatar = avatar_index.lookup_any_format(folder_path, filename)
+                mimetype = None
+
+            if avatar:
                 try:
-                    return send_file(avatar_path)
+                    return avatar_response(avatar, AVATAR_FOLDER, mimetype)
 
                 except FileNotFoundError:
                     return {
@@ -130,31 +236,26 @@ class AvatarGET(Resource):
 
 
 class AvatarPUT(Resource):
+    decorators = [limiter.limit(HEAVY_LIMIT)]
+
     @classmethod
     @jwt_required
     def put(cls):
+        '''
+        Generates every avatar size and format once, here,
+        so that AvatarGET never has to resize anything.
+        '''
         try:
             data = image_schema.load(request.files)
             filename = f'user_{get_jwt_identity()}'
             folder = 'avatars' if not authorized() else 'admin_avatars'
-            avatar_path = image_helper.find_image_any_format(filename, folder)
-            if avatar_path:
-                try:
-                    os.remove(avatar_path)
-
-                except Exception as ex:
-                    print(ex)
+            folder_path = image_helper.get_folder_path(folder)
+            written = image_helper.avatar_variant_names(filename)
 
             try:
-                absolute_path = f'{os.getcwd()}/static/images/{folder}'
-                ext = image_helper.get_extension(data['image'].filename)
-                avatar = filename + ext
-                image_helper.save_image(data["image"], folder, avatar)
-                image_helper.change_image_type_and_resize(
-                    absolute_path, avatar)
-                return {
-                    "message": get_text('image_avatar_uploaded')
-                }, 201
+                image_helper.get_upload_name(data['image'])
+                image_workers.save_avatar_variants(
+                    data['image'].stream, folder_path, filename)
 
             except UploadNotAllowed:
                 extension = image_helper.get_extension(data['image'])
@@ -162,6 +263,32 @@ class AvatarPUT(Resource):
                     "message": get_text('image_illegal_file_type').format(extension=extension)
                 }, 400
 
+            except UnidentifiedImageError:
+                return {
+                    "message": get_text('image_invalid')
+                }, 400
+
+            except ImageWorkersBusy:
+                return {
+                    "message": get_text('image_workers_busy')
+                }, 503, {"Retry-After": str(RETRY_AFTER)}
+
+            # the single file avatar from before variants existed is superseded
+            legacy_avatar = avatar_index.lookup_any_format(folder_path, filename)
+            if legacy_avatar:
+                try:
+                    os.remove(legacy_avatar.path)
+                    written.append(os.path.relpath(legacy_avatar.path, folder_path))
+
+                except Exception as ex:
+                    print(ex)
+
+            avatar_index.update(folder_path, written)
+
+            return {
+                "message": get_text('image_avatar_uploaded')
+            }, 201
+
         except ValidationError as error:
             return {"message": get_text('input_error_generic'), "info": error.messages}, 400
 
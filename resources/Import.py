@@ -0,0 +1,48 @@
+import io
+from typing import Dict
+from flask_restful import Resource
+from flask import request
+from flask_jwt_extended import jwt_required, get_jwt_claims
+
+from limiter import limiter, HEAVY_LIMIT
+
+from helpers.catalog_import import import_catalog, IMPORT_KINDS, FORMATS
+from helpers.strings import get_text
+
+
+class CatalogImport(Resource):
+    decorators = [limiter.limit(HEAVY_LIMIT)]
+
+    @classmethod
+    @jwt_required
+    def post(cls, kind) -> Dict:
+        '''
+        Bulk imports the request body, one record per line (NDJSON) or per row (CSV), e.g.
+        POST /v1/import/episodes?format=csv
+        Request bodies are capped by the upload size limit, use `flask import-catalog` for larger files.
+        '''
+        current_user_role = get_jwt_claims().get("role", None)
+        if not current_user_role or current_user_role == "Regular Member":
+            return {"message": get_text('import_access_forbidden')}, 403
+
+        if kind not in IMPORT_KINDS:
+            return {
+                "message": get_text('import_kind_not_found').format(kind=kind, kinds=", ".join(IMPORT_KINDS))
+            }, 404
+
+        file_format = request.args.get("format", None, type=str)
+        if file_format is None:
+            file_format = "csv" if request.mimetype == "text/csv" else "ndjson"
+        if file_format not in FORMATS:
+            return {"message": get_text('import_format_invalid')}, 400
+
+        try:
+            stream = io.TextIOWrapper(request.stream, encoding="utf-8", newline="")
+            return import_catalog(kind, stream, file_format), 200
+
+        except UnicodeDecodeError:
+            return {"message": get_text('import_encoding_error')}, 400
+
+        except Exception as ex:
+            print(ex)
+            return {"message": get_text('server_error_generic')}, 500
@@ -0,0 +1,69 @@
+import uuid
+from flask_restful import Resource
+from flask import request
+from flask_jwt_extended import jwt_required, get_current_user
+
+from limiter import limiter, READ_LIMIT
+
+from models.Anime import AnimeModel
+from models.User import UserModel
+from schemas.Anime import AnimeSchema
+
+from helpers.check_uuid import valid_uuid4
+from helpers.recommender import recommender
+from helpers.strings import get_text
+
+animes_list_schema = AnimeSchema(many=True)
+
+DEFAULT_RECOMMENDATIONS = 12
+MAX_RECOMMENDATIONS = 48
+
+
+def recommendations_limit() -> int:
+    limit = request.args.get("limit", DEFAULT_RECOMMENDATIONS, type=int)
+    return max(1, min(limit, MAX_RECOMMENDATIONS))
+
+
+class SimilarAnimes(Resource):
+    decorators = [limiter.limit(READ_LIMIT)]
+
+    @classmethod
+    def get(cls, anime_id):
+        '''Animes that users who saved this anime also saved.'''
+        if not valid_uuid4(anime_id):
+            return {"message": get_text('anime_uuid_error')}, 400
+
+        try:
+            anime_ids = recommender.similar(uuid.UUID(anime_id), recommendations_limit())
+            return {
+                "animes": animes_list_schema.dump(AnimeModel.list_items_by_ids(anime_ids))
+            }, 200
+
+        except Exception as ex:
+            print(ex)
+            return {"message": get_text('server_error_generic')}, 500
+
+
+class ForYou(Resource):
+    decorators = [limiter.limit(READ_LIMIT)]
+
+    @classmethod
+    @jwt_required
+    def get(cls):
+        '''Animes close to everything in user's collection.'''
+        try:
+            user_id = get_current_user().id
+            if not user_id:
+                return {"message": get_text('user_not_found')}, 404
+
+            anime_ids = recommender.for_user(
+                UserModel.saved_anime_ids(user_id),
+                recommendations_limit()
+            )
+            return {
+                "animes": animes_list_schema.dump(AnimeModel.list_items_by_ids(anime_ids))
+            }, 200
+
+        except Exception as ex:
+            print(ex)
+            return {"message": get_text('server_error_generic')}, 500
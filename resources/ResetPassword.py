@@ -8,7 +8,8 @@ from models.User import UserModel
 from models.PasswordReset import PasswordResetModel
 
 from helpers.strings import get_text
-from helpers.send_in_blue import SendInBlue, SendInBlueError
+from helpers.mail_queue import queue_email
+from helpers.send_in_blue import SendInBlue
 
 FRONTEND_DOMAIN_NAME = os.environ.get('FRONTEND_DOMAIN_NAME', None)
 
@@ -55,12 +56,12 @@ class RequestPasswordReset(Resource):
                     token = password_reset.password_reset_id
                     pw_reset_link = f'{FRONTEND_DOMAIN_NAME}/reset_password?token={token}'
 
-                    # Send email to user
-                    SendInBlue.send_pw_reset_email(
+                    # Queue email to user
+                    queue_email(SendInBlue.pw_reset_email(
                         name=user.name,
                         email=user.email,
                         pw_reset_link=pw_reset_link
-                    )
+                    ))
                     return {
                         "message": get_text('reset_password_email_sent'),
                         "token": token
@@ -75,12 +76,6 @@ class RequestPasswordReset(Resource):
                 "message": get_text('reset_password_user_not_found')
             }, 404
 
-        except SendInBlueError as error:
-            print(error)
-            return {
-                "message": get_text('reset_password_failed_to_send_email')
-            }, 500
-
         except Exception as ex:
             print(ex)
             return {
@@ -0,0 +1,67 @@
+from typing import Dict
+from flask_restful import Resource
+from flask import request
+
+from limiter import limiter, READ_LIMIT
+
+from models.Anime import AnimeModel
+from schemas.Anime import AnimeSchema
+
+from helpers.cache import search_cache, catalog_cache_key
+from helpers.pagination import InvalidCursor
+from helpers.strings import get_text
+
+animes_list_schema = AnimeSchema(many=True)
+
+MAX_QUERY_LENGTH = 200
+
+
+class Search(Resource):
+    decorators = [limiter.limit(READ_LIMIT)]
+
+    @classmethod
+    def get(cls) -> Dict:
+        '''
+        Searches anime titles and synopses, e.g.
+        /v1/search?q=titan&genre=action&status=Completed&cursor=...
+        '''
+        try:
+            text = request.args.get("q", "", type=str).strip()
+            genre_name = request.args.get("genre", None, type=str)
+            status = request.args.get("status", None, type=str)
+            cursor = request.args.get("cursor", None, type=str)
+
+            if not text:
+                return {"message": get_text('search_query_required')}, 400
+
+            if len(text) > MAX_QUERY_LENGTH:
+                return {
+                    "message": get_text('search_query_too_long').format(max_length=MAX_QUERY_LENGTH)
+                }, 400
+
+            if genre_name:
+                # same format as /v1/genre/<genre_name>
+                genre_name = " ".join(genre_name.split("-")).capitalize()
+
+            cache_key = catalog_cache_key("search", text, genre_name, status, cursor)
+            cached = search_cache.get(cache_key)
+            if cached is not None:
+                return cached, 200
+
+            anime = AnimeModel.search(text, cursor or None, genre_name, status)
+            results = {
+                "animes": animes_list_schema.dump(anime.items),
+                "prev_cursor": anime.prev_cursor,
+                "next_cursor": anime.next_cursor,
+                "query": text
+            }
+            search_cache.set(cache_key, results)
+
+            return results, 200
+
+        except InvalidCursor:
+            return {"message": get_text('pagination_invalid_cursor')}, 400
+
+        except Exception as ex:
+            print(ex)
+            return {"message": get_text('server_error_generic')}, 500
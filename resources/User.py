@@ -9,30 +9,37 @@ from flask_jwt_extended import (
     create_refresh_token,
     decode_token,
     jwt_refresh_token_required,
-    get_jwt_identity,
+    get_current_user,
     jwt_required
 )
 from werkzeug.security import check_password_hash, generate_password_hash
 from marshmallow.exceptions import ValidationError
 
+from limiter import limiter, AUTH_LIMIT
+
 from models.User import UserModel
 from models.UserConfirmation import ConfirmationModel
 
 from schemas.Auth import AuthSchema
-from schemas.User import UserSchema, SaveUserAnimeSchema, DumpUserInfoSchema
+from schemas.User import UserSchema, SaveUserAnimeSchema, BulkUserAnimeSchema, DumpUserInfoSchema
 
-from helpers.send_in_blue import SendInBlue, SendInBlueError
+from helpers.cache import bump_catalog_version
+from helpers.mail_queue import queue_email
+from helpers.send_in_blue import SendInBlue
 from helpers.strings import get_text
 
 auth_schema = AuthSchema()
 user_info_schema = UserSchema()
 user_anime_save_schema = SaveUserAnimeSchema()
+user_anime_bulk_schema = BulkUserAnimeSchema()
 user_min_info_schema = DumpUserInfoSchema()
 
 DOMAIN_NAME = os.environ.get("DOMAIN_NAME")
 
 
 class Login(Resource):
+    decorators = [limiter.limit(AUTH_LIMIT)]
+
     @classmethod
     def post(cls):
         try:
@@ -84,8 +91,8 @@ class RefreshToken(Resource):
     @jwt_refresh_token_required
     def post(cls):
         try:
-            current_user = get_jwt_identity()
-            user = UserModel.find_by_username(current_user)
+            # refresh tokens carry no claims, so this goes by username
+            user = get_current_user().load(UserModel._id, UserModel.username, UserModel.role)
             if user:
                 return {
                     'access_token': create_access_token(identity=user)
@@ -109,8 +116,8 @@ class ChangePassword(Resource):
         If correct set the new password to current password.
         '''
         try:
-            current_user = get_jwt_identity()
-            user = UserModel.find_by_username(current_user)
+            current_user = get_current_user()
+            user = current_user.load(UserModel._id, UserModel.password)
             if user:
                 old_password = request.get_json().get('old_password', None)
                 new_password = request.get_json().get('new_password', None)
@@ -126,8 +133,7 @@ class ChangePassword(Resource):
                     }, 400
 
                 if check_password_hash(user.password, old_password):
-                    user.password = generate_password_hash(new_password)
-                    user.save_to_db()
+                    UserModel.update_password(user._id, generate_password_hash(new_password))
                     return {
                         "message": get_text('user_password_updated')
                     }, 200
@@ -148,6 +154,8 @@ class ChangePassword(Resource):
 
 
 class Register(Resource):
+    decorators = [limiter.limit(AUTH_LIMIT)]
+
     @classmethod
     def post(cls):
         try:
@@ -168,19 +176,14 @@ class Register(Resource):
             if user_id:
                 token = confirmation.confirmation_id
                 activation_link = f"{DOMAIN_NAME}/v1/user/activate?token={token}"
-                try:
-                    SendInBlue.send_activation_email(
-                        name=new_user.name,
-                        email=new_user.email,
-                        activation_link=activation_link
-                    )
-
-                    return {"message": get_text('user_activation_email_sent')}, 200
-                except SendInBlueError as err:
-                    print(err)
-                    new_user.delete_from_db()
-                    confirmation.delete_from_db()
-                    return {"message": get_text('user_registeration_error')}, 500
+                # sent by the mail worker, no need to wait for SendInBlue here
+                queue_email(SendInBlue.activation_email(
+                    name=new_user.name,
+                    email=new_user.email,
+                    activation_link=activation_link
+                ))
+
+                return {"message": get_text('user_activation_email_sent')}, 200
 
         except ValidationError as error:
             return {"message": get_text('input_error_generic'), "info": error.messages}, 400
@@ -196,13 +199,18 @@ class UserInfo(Resource):
     @classmethod
     @jwt_required
     def get(cls):
-        username = get_jwt_identity()
+        current_user = get_current_user()
         try:
-            user = UserModel.find_by_username(username)
+            user = current_user.load(
+                UserModel._id,
+                UserModel.name,
+                UserModel.username,
+                UserModel.email,
+                UserModel.role,
+                UserModel.joined
+            )
             if user:
-                saved_animes = user.saved_animes.\
-                    with_entities("anime_info.anime_id", "anime_info.title", "anime_info.poster_uri").\
-                    order_by("title").all()
+                saved_animes = UserModel.saved_animes_list(user._id)
                 return {
                     **user_min_info_schema.dump(user),
                     "saved_animes": [
@@ -228,18 +236,19 @@ class SaveAnime(Resource):
     @jwt_required
     def post(cls):
         try:
-            user_id = get_jwt_identity()
+            user_id = get_current_user().id
             post_data = user_anime_save_schema.load(request.get_json())
-            user = UserModel.find_by_username(user_id)
             anime_id = post_data['anime_id']
-            if user:
-                if user.has_user_saved_anime(anime_id):
+            if user_id:
+                if UserModel.has_user_saved_anime(user_id, anime_id):
                     return {
                         "message": get_text('user_anime_saved_already')
                     }, 400
 
-                successful = user.save_anime(anime_id)
+                successful = UserModel.save_anime(user_id, anime_id)
                 if successful:
+                    # the anime's save count (and the popular order) changed
+                    bump_catalog_version()
                     return {
                         "message": get_text('user_anime_saved')
                     }, 201
@@ -263,14 +272,14 @@ class SaveAnime(Resource):
     @jwt_required
     def delete(cls):
         try:
-            user_id = get_jwt_identity()
+            user_id = get_current_user().id
             data = user_anime_save_schema.load(request.get_json())
-            user = UserModel.find_by_username(user_id)
             anime_id = data['anime_id']
-            if user:
-                if user.has_user_saved_anime(anime_id):
-                    successful = user.remove_anime(anime_id)
+            if user_id:
+                if UserModel.has_user_saved_anime(user_id, anime_id):
+                    successful = UserModel.remove_anime(user_id, anime_id)
                     if successful:
+                        bump_catalog_version()
                         return {
                             "message": get_text('user_anime_removing_successful')
                         }, 200
@@ -293,3 +302,37 @@ class SaveAnime(Resource):
         except Exception as ex:
             print(ex)
             return {"message": get_text('server_error_generic')}, 500
+
+
+class SavedAnimes(Resource):
+    @classmethod
+    @jwt_required
+    def post(cls):
+        '''
+        Adds and removes lists of animes in one go, e.g.
+        {"add": [anime_id, ...], "remove": [anime_id, ...]}.
+        Ids that are already in the requested state are not errors.
+        '''
+        try:
+            user_id = get_current_user().id
+            data = user_anime_bulk_schema.load(request.get_json())
+            if user_id:
+                results = UserModel.bulk_update_saved_animes(
+                    user_id,
+                    data["add"],
+                    data["remove"]
+                )
+                if "saved" in results["added"].values() or "removed" in results["removed"].values():
+                    bump_catalog_version()
+                return results, 200
+
+            return {
+                "message": get_text('user_not_found')
+            }, 404
+
+        except ValidationError as error:
+            return {"message": get_text('input_error_generic'), "info": error.messages}, 400
+
+        except Exception as ex:
+            print(ex)
+            return {"message": get_text('server_error_generic')}, 500
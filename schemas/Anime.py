@@ -6,6 +6,8 @@ from schemas.Episode import EpisodeSchema
 class AnimeSchema(ma.SQLAlchemyAutoSchema):
     class Meta:
         model = AnimeModel
+        dump_only = ("save_count", "revision", "updated_at")
+        exclude = ("search_vector",)
 
     genres_list = ma.List(ma.Str())
     genres = ma.Pluck("GenreSchema", "genre_name", many=True)
@@ -8,3 +8,4 @@ class EpisodeSchema(ma.SQLAlchemyAutoSchema):
     class Meta:
         model = EpisodeModel
         include_fk = True
+        dump_only = ("revision", "updated_at")
@@ -3,7 +3,14 @@ from marshmallow import Schema, fields
 from models.Genre import GenreModel
 
 
+class GenreLinkSchema(ma.Schema):
+    '''Links an anime to a genre, used by the catalog import.'''
+    anime_id = fields.UUID(required=True)
+    genre_name = fields.Str(required=True)
+
+
 class GenreSchema(ma.SQLAlchemyAutoSchema):
     class Meta:
         model = GenreModel
         exclude = ("genre_id",)
+        dump_only = ("revision", "updated_at")
@@ -1,5 +1,5 @@
 from ma import ma
-from marshmallow import fields
+from marshmallow import fields, validate, validates_schema, ValidationError
 from models.User import UserModel
 
 
@@ -13,6 +13,19 @@ class SaveUserAnimeSchema(ma.Schema):
         fields = ("anime_id",)
 
 
+class BulkUserAnimeSchema(ma.Schema):
+    '''Lists of anime ids to add to and remove from user's collection.'''
+    MAX_IDS = 1000
+
+    add = fields.List(fields.UUID(), missing=list, validate=validate.Length(max=MAX_IDS))
+    remove = fields.List(fields.UUID(), missing=list, validate=validate.Length(max=MAX_IDS))
+
+    @validates_schema
+    def validate_disjoint(self, data, **kwargs):
+        if set(data["add"]) & set(data["remove"]):
+            raise ValidationError("An anime can't be added and removed at the same time.")
+
+
 class DumpUserInfoSchema(ma.Schema):
     class Meta:
         fields = (
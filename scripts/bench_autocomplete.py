@@ -0,0 +1,103 @@
+'''
+scripts.bench_autocomplete
+
+Latency of title suggestions (GET /v1/autocomplete) against the titles in the
+database DB_URI points to.
+
+Loads helpers.autocomplete.title_index once, timing the load and measuring the
+memory the index takes, then types titles of the catalog one keystroke at a
+time and times every suggestion. A share of the typed titles gets a typo so
+the trigram fallback is timed as well.
+
+    python -m scripts.bench_autocomplete --titles 500 --typos 0.2
+
+--seed imports benchmark animes first, see scripts.bench_export.
+'''
+import argparse
+import random
+import statistics
+import tracemalloc
+from time import perf_counter
+
+from wsgi import app
+from db import db
+from models.Anime import AnimeModel
+from helpers.autocomplete import title_index
+from scripts.bench_export import seed
+
+MAX_TYPED = 12  # keystrokes per title, nobody types a whole long title
+
+
+def with_typo(title: str, rng: random.Random) -> str:
+    '''Swaps two neighbouring letters, the most common typo.'''
+    if len(title) < 4:
+        return title
+    position = rng.randrange(1, len(title) - 2)
+    return title[:position] + title[position + 1] + title[position] + title[position + 2:]
+
+
+def keystrokes(titles: list, typos: float) -> list:
+    '''Every prefix typed on the way to each title, as (kind, prefix).'''
+    rng = random.Random(0)
+    typed = []
+    for title in titles:
+        kind = "typo" if rng.random() < typos else "prefix"
+        text = with_typo(title, rng) if kind == "typo" else title
+        typed.extend((kind, text[:length]) for length in range(1, min(len(text), MAX_TYPED) + 1))
+    return typed
+
+
+def percentiles(timings: list) -> str:
+    timings = sorted(timings)
+    if not timings:
+        return "no runs"
+
+    def at(share):
+        return timings[min(len(timings) - 1, int(len(timings) * share))] * 1000
+
+    return (f"p50 {statistics.median(timings) * 1000:6.3f} ms  p95 {at(0.95):6.3f} ms  "
+            f"p99 {at(0.99):6.3f} ms  max {timings[-1] * 1000:6.3f} ms  ({len(timings)} runs)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", type=int, default=0, help="Benchmark animes to have in the catalog.")
+    parser.add_argument("--titles", type=int, default=300, help="Titles to type.")
+    parser.add_argument("--typos", type=float, default=0.2, help="Share of the titles typed with a typo.")
+    parser.add_argument("--limit", type=int, default=8, help="Suggestions per keystroke.")
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.seed:
+            seed(args.seed, 12)
+
+        tracemalloc.start()
+        started_at = perf_counter()
+        title_index.load()
+        load_seconds = perf_counter() - started_at
+        index_size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        titles = [
+            title for (title,) in
+            db.session.query(AnimeModel.title).order_by(db.func.random()).limit(args.titles)
+        ]
+        db.session.rollback()
+
+    # suggestions come from memory, no app context past the load
+    title_index.refresh_interval = 0
+    timings = {"prefix": [], "typo": []}
+    for kind, prefix in keystrokes(titles, args.typos):
+        started_at = perf_counter()
+        title_index.suggest(prefix, args.limit)
+        timings[kind].append(perf_counter() - started_at)
+
+    print(f"{len(title_index._titles)} title(s) loaded in {load_seconds:.3f}s, "
+          f"index takes {index_size / 1024 / 1024:.1f} MB\n")
+    print(f"prefix  {percentiles(timings['prefix'])}")
+    print(f"typo    {percentiles(timings['typo'])}")
+    print(f"all     {percentiles(timings['prefix'] + timings['typo'])}")
+
+
+if __name__ == "__main__":
+    main()
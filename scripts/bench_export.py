@@ -0,0 +1,142 @@
+'''
+scripts.bench_export
+
+Throughput benchmark of the catalog export (GET /v1/export/catalog.ndjson).
+
+Times every stage of the export on its own against the database DB_URI points
+to: reading the rows, building the NDJSON lines, packing them into chunks and
+gzipping them. The database needs the latest migrations.
+
+    python -m scripts.bench_export --seed 20000 --episodes 12 --repeat 3
+
+--seed makes sure that many benchmark animes (titles "bench-export-<n>") are
+in the catalog, importing the missing ones along with their episodes and
+links to the existing genres. Use a scratch database, seeded rows are kept.
+'''
+import argparse
+import io
+import json
+import resource
+import statistics
+import uuid
+from time import perf_counter
+
+from wsgi import app
+from db import db
+from models.Anime import AnimeModel
+from models.Genre import GenreModel
+from helpers.catalog_import import import_catalog
+from resources.Export import catalog_lines, chunked, gzipped
+
+SEED_PREFIX = "bench-export-"
+SEED_NAMESPACE = uuid.UUID("6d1a4c8e-3f0b-4f7a-9a43-0c2b5e8d7f11")
+
+
+def _anime_id(number: int) -> str:
+    return str(uuid.uuid5(SEED_NAMESPACE, f"{SEED_PREFIX}{number}"))
+
+
+def _ndjson(records) -> io.StringIO:
+    return io.StringIO("".join(json.dumps(record) + "\n" for record in records))
+
+
+def seed(count: int, episodes: int) -> None:
+    '''Imports benchmark animes 0..count-1 that aren't there yet.'''
+    existing = AnimeModel.query.filter(AnimeModel.title.startswith(SEED_PREFIX)).count()
+    if existing >= count:
+        return
+
+    numbers = range(existing, count)
+    animes = (
+        {
+            "anime_id": _anime_id(number),
+            "title": f"{SEED_PREFIX}{number}",
+            "rating": round(5 + (number % 50) / 10, 1),
+            "release": f"{2000 + number % 25}",
+            "status": "Completed" if number % 3 else "Airing",
+            "synopsis": f"Synopsis of benchmark anime {number}. " * 8,
+            "number_of_episodes": episodes,
+            "poster_uri": f"https://example.com/posters/{number}.jpg"
+        }
+        for number in numbers
+    )
+    episode_records = (
+        {
+            "anime_id": _anime_id(number),
+            "episode_number": episode,
+            "episode_uri_1": f"https://example.com/{number}/{episode}.mp4"
+        }
+        for number in numbers
+        for episode in range(1, episodes + 1)
+    )
+    genre_names = [genre.genre_name for genre in GenreModel.query.order_by(GenreModel.genre_name)]
+    links = (
+        {"anime_id": _anime_id(number), "genre_name": genre_names[(number + offset) % len(genre_names)]}
+        for number in numbers
+        for offset in range(min(3, len(genre_names)))
+    )
+
+    for kind, records in (("anime", animes), ("episodes", episode_records), ("genre_links", links)):
+        report = import_catalog(kind, _ndjson(records))
+        print(f"seeded {report['imported']} {kind} ({report['error_count']} error(s)) in {report['seconds']}s")
+
+
+def _rows():
+    for _ in AnimeModel.export_rows():
+        yield b""
+
+
+def _lines():
+    for line in catalog_lines():
+        yield line.encode("utf-8")
+
+
+STAGES = (
+    ("rows", _rows),
+    ("ndjson lines", _lines),
+    ("ndjson chunks", lambda: chunked(catalog_lines())),
+    ("gzip chunks", lambda: gzipped(chunked(catalog_lines()))),
+)
+
+
+def run(stage) -> tuple:
+    '''Drains one export, returns (seconds, items, bytes).'''
+    started_at = perf_counter()
+    items = size = 0
+    for item in stage():
+        items += 1
+        size += len(item)
+    seconds = perf_counter() - started_at
+    db.session.rollback()  # ends the read transaction between runs
+    return seconds, items, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", type=int, default=0, help="Benchmark animes to have in the catalog.")
+    parser.add_argument("--episodes", type=int, default=12, help="Episodes per seeded anime.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per stage, the median is reported.")
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.seed:
+            seed(args.seed, args.episodes)
+
+        animes = AnimeModel.query.count()
+        print(f"{animes} anime(s) in the catalog, {args.repeat} run(s) per stage\n")
+        print(f"{'stage':<14} {'seconds':>8} {'animes/s':>10} {'MB':>8} {'MB/s':>8}")
+        for name, stage in STAGES:
+            runs = [run(stage) for _ in range(args.repeat)]
+            seconds = statistics.median(seconds for seconds, _, _ in runs)
+            size = runs[-1][2] / 1024 / 1024
+            print(
+                f"{name:<14} {seconds:>8.3f} {animes / seconds if seconds else 0:>10.0f} "
+                f"{size:>8.2f} {size / seconds if seconds else 0:>8.2f}"
+            )
+
+        # ru_maxrss is in kilobytes on Linux
+        print(f"\npeak memory {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
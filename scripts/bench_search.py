@@ -0,0 +1,95 @@
+'''
+scripts.bench_search
+
+Latency of full text search (GET /v1/search) against the database DB_URI
+points to, straight through AnimeModel.search so the response cache is not
+involved.
+
+Queries are words taken from the titles in the catalog, so they match the
+way real searches do. Every query is run for its first page and, when there
+is one, for the page after it through the cursor.
+
+    python -m scripts.bench_search --queries 500 --genre action
+
+--seed imports benchmark animes first, see scripts.bench_export.
+'''
+import argparse
+import random
+import statistics
+from time import perf_counter
+
+from wsgi import app
+from db import db
+from models.Anime import AnimeModel
+from scripts.bench_export import seed
+
+
+def sample_queries(count: int) -> list:
+    '''Words of random titles, one or two per query.'''
+    titles = [
+        title for (title,) in
+        db.session.query(AnimeModel.title).order_by(db.func.random()).limit(count)
+    ]
+    rng = random.Random(0)
+    queries = []
+    for title in titles:
+        words = [word for word in title.split() if len(word) > 2] or title.split()
+        queries.append(" ".join(rng.sample(words, min(len(words), rng.choice((1, 2))))))
+    return queries
+
+
+def percentiles(timings: list) -> str:
+    timings = sorted(timings)
+    if not timings:
+        return "no runs"
+
+    def at(share):
+        return timings[min(len(timings) - 1, int(len(timings) * share))] * 1000
+
+    return (f"p50 {statistics.median(timings) * 1000:7.2f} ms  p95 {at(0.95):7.2f} ms  "
+            f"p99 {at(0.99):7.2f} ms  max {timings[-1] * 1000:7.2f} ms  ({len(timings)} runs)")
+
+
+def timed(call) -> tuple:
+    started_at = perf_counter()
+    result = call()
+    return result, perf_counter() - started_at
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", type=int, default=0, help="Benchmark animes to have in the catalog.")
+    parser.add_argument("--queries", type=int, default=200, help="Distinct queries to run.")
+    parser.add_argument("--genre", default=None, help="Filter every query by this genre, e.g. action.")
+    parser.add_argument("--status", default=None, help="Filter every query by this status.")
+    args = parser.parse_args()
+    # same format as the endpoint
+    genre_name = " ".join(args.genre.split("-")).capitalize() if args.genre else None
+
+    with app.app_context():
+        if args.seed:
+            seed(args.seed, 12)
+
+        queries = sample_queries(args.queries)
+        # warms the connection pool and the database caches up
+        for text in queries[:10]:
+            AnimeModel.search(text, None, genre_name, args.status)
+        db.session.rollback()
+
+        first_pages, next_pages, results = [], [], 0
+        for text in queries:
+            page, seconds = timed(lambda: AnimeModel.search(text, None, genre_name, args.status))
+            first_pages.append(seconds)
+            results += len(page.items)
+            if page.next_cursor:
+                _, seconds = timed(lambda: AnimeModel.search(text, page.next_cursor, genre_name, args.status))
+                next_pages.append(seconds)
+            db.session.rollback()
+
+        print(f"{len(queries)} queries, {results / max(len(queries), 1):.1f} results on the first page on average\n")
+        print(f"first page  {percentiles(first_pages)}")
+        print(f"next page   {percentiles(next_pages)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+'''
+scripts.bench_uploads
+
+Throughput and peak memory of avatar uploads (PUT /v1/user/avatar) at a
+given number of concurrent uploads.
+
+Every upload goes through the whole request, the process pool and the slot
+admission of helpers.image_workers, so uploads beyond IMAGE_JOB_SLOTS are
+answered with 503 just like in production. The avatars are written to a
+temporary folder and nothing touches the database.
+
+    python -m scripts.bench_uploads --concurrency 1 10 50 --uploads 100
+
+Peak memory is the largest sum of the resident sizes of this process and its
+image worker processes, sampled while the uploads run. Linux only (/proc).
+'''
+import argparse
+import io
+import os
+import statistics
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from types import SimpleNamespace
+
+import numpy as np
+from PIL import Image
+from flask_jwt_extended import create_access_token
+
+from wsgi import app
+from limiter import limiter
+from helpers import image_workers
+
+SAMPLE_INTERVAL = 0.05  # seconds
+
+
+def _rss(pid) -> int:
+    '''Resident set size of a process in bytes, 0 once it is gone.'''
+    try:
+        with open(f"/proc/{pid}/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (FileNotFoundError, ProcessLookupError):
+        return 0
+
+
+def _children(pid) -> list:
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as stat:
+                # the command may contain spaces, the parent pid comes after its closing paren
+                if int(stat.read().rsplit(")", 1)[1].split()[1]) == pid:
+                    children.append(int(entry))
+        except (FileNotFoundError, ProcessLookupError, IndexError, ValueError):
+            continue
+    return children
+
+
+class PeakMemory:
+    '''Samples this process and its children until stopped.'''
+
+    def __init__(self):
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        pid = os.getpid()
+        while not self._stop.is_set():
+            total = _rss(pid) + sum(_rss(child) for child in _children(pid))
+            self.peak = max(self.peak, total)
+            self._stop.wait(SAMPLE_INTERVAL)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def make_photo(width: int, height: int) -> bytes:
+    '''A noisy JPEG, about as hard to decode as a phone photo of that size.'''
+    pixels = np.random.default_rng(0).integers(0, 256, (height, width, 3), dtype=np.uint8)
+    photo = io.BytesIO()
+    Image.fromarray(pixels).save(photo, "JPEG", quality=90)
+    return photo.getvalue()
+
+
+def upload(token: str, photo: bytes) -> tuple:
+    '''One upload with its own test client, returns (status code, seconds).'''
+    client = app.test_client()
+    started_at = perf_counter()
+    response = client.put(
+        "/v1/user/avatar",
+        data={"image": (io.BytesIO(photo), "avatar.jpg")},
+        headers={"Authorization": f"Bearer {token}"},
+        content_type="multipart/form-data"
+    )
+    return response.status_code, perf_counter() - started_at
+
+
+def run(concurrency: int, uploads: int, tokens: list, photo: bytes) -> dict:
+    with PeakMemory() as memory:
+        started_at = perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(lambda i: upload(tokens[i % len(tokens)], photo), range(uploads)))
+        seconds = perf_counter() - started_at
+
+    done = sorted(took for status, took in results if status == 201)
+    return {
+        "seconds": seconds,
+        "ok": len(done),
+        "busy": sum(1 for status, _ in results if status == 503),
+        "failed": sum(1 for status, _ in results if status not in (201, 503)),
+        "p50": statistics.median(done) if done else 0,
+        "p99": done[min(len(done) - 1, int(len(done) * 0.99))] if done else 0,
+        "peak": memory.peak
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50],
+                        help="Concurrent uploads, one run each.")
+    parser.add_argument("--uploads", type=int, default=100, help="Uploads per run.")
+    parser.add_argument("--width", type=int, default=3000, help="Width of the uploaded photo.")
+    parser.add_argument("--height", type=int, default=2000, help="Height of the uploaded photo.")
+    args = parser.parse_args()
+
+    limiter.enabled = False
+    # avatar uploads don't need the database, skip create_all
+    app.before_first_request_funcs.clear()
+    photo = make_photo(args.width, args.height)
+    # avatars are written relative to the working directory (UPLOADED_IMAGES_DEST)
+    os.chdir(tempfile.mkdtemp(prefix="bench_uploads_"))
+
+    with app.app_context():
+        users = [
+            SimpleNamespace(_id=number, username=f"bench{number}", name="Bench", role="Regular Member")
+            for number in range(max(args.concurrency))
+        ]
+        tokens = [create_access_token(identity=user) for user in users]
+
+    print(f"{len(photo) / 1024 / 1024:.1f} MB photo, {args.uploads} upload(s) per run, "
+          f"{image_workers.IMAGE_JOB_SLOTS} slot(s), {image_workers.IMAGE_WORKERS} image worker(s)\n")
+    print(f"{'concurrent':>10} {'uploads/s':>10} {'ok':>5} {'503':>5} {'failed':>6} "
+          f"{'p50 s':>7} {'p99 s':>7} {'peak MB':>8}")
+    for concurrency in args.concurrency:
+        result = run(concurrency, args.uploads, tokens, photo)
+        print(
+            f"{concurrency:>10} {result['ok'] / result['seconds']:>10.1f} {result['ok']:>5} "
+            f"{result['busy']:>5} {result['failed']:>6} {result['p50']:>7.3f} {result['p99']:>7.3f} "
+            f"{result['peak'] / 1024 / 1024:>8.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
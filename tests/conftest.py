@@ -0,0 +1,122 @@
+'''
+The tests run against the PostgreSQL database TEST_DB_URI points to and are
+skipped without it. Every table in it is dropped and created again, so use a
+scratch database:
+
+    TEST_DB_URI=postgresql://localhost/myannime_test python -m pytest tests
+'''
+import os
+import tempfile
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+TEST_DB_URI = os.environ.get("TEST_DB_URI")
+TEST_SETTINGS = "TESTING = True\nRATELIMIT_ENABLED = False\n"
+
+
+@pytest.fixture(scope="session")
+def app():
+    if not TEST_DB_URI:
+        pytest.skip("TEST_DB_URI is not set")
+
+    # default_config reads these when the app is imported
+    os.environ["DB_URI"] = TEST_DB_URI
+    os.environ.setdefault("JWT_SECRET", "test")
+    os.environ.setdefault("APP_SECRET", "test")
+    fd, settings_path = tempfile.mkstemp(suffix=".cfg")
+    with os.fdopen(fd, "w") as settings:
+        settings.write(TEST_SETTINGS)
+    os.environ["APPLICATION_SETTINGS"] = settings_path
+
+    from wsgi import app
+    from db import db
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        # creates the tables again, now rather than in the first request a test counts
+        app.try_trigger_before_first_request_functions()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+    os.remove(settings_path)
+
+
+@pytest.fixture
+def session(app):
+    '''db.session, every table is emptied after the test.'''
+    from db import db
+
+    yield db.session
+    db.session.rollback()
+    for table in reversed(db.metadata.sorted_tables):
+        db.session.execute(table.delete())
+    db.session.commit()
+    db.session.expunge_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def count_statements(app):
+    '''
+    Collects the SQL statements sent to the database inside the block:
+        with count_statements() as statements: ...
+    '''
+    from db import db
+
+    @contextmanager
+    def counting():
+        statements = []
+
+        def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+
+    return counting
+
+
+@pytest.fixture
+def make_anime(session):
+    '''Creates an anime with the given genres (created when missing) and episodes.'''
+    from models.Anime import AnimeModel
+    from models.Episode import EpisodeModel
+    from models.Genre import GenreModel
+
+    def make(title, genres=(), episodes=0, rating=8.0, save_count=0):
+        for genre_name in genres:
+            if not GenreModel.find_by_name(genre_name):
+                GenreModel(genre_name=genre_name).save_to_db()
+
+        anime = AnimeModel(
+            title=title,
+            rating=rating,
+            release="2020",
+            status="Completed",
+            synopsis=f"The synopsis of {title}.",
+            number_of_episodes=episodes,
+            poster_uri=f"https://example.com/{len(title)}.jpg",
+            save_count=save_count
+        )
+        anime.save_to_db(list(genres))
+        for number in range(1, episodes + 1):
+            session.add(EpisodeModel(
+                anime_id=anime.anime_id,
+                episode_number=number,
+                episode_uri_1=f"https://example.com/episodes/{number}.mp4"
+            ))
+        session.commit()
+        return anime
+
+    return make
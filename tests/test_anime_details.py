@@ -0,0 +1,30 @@
+from models.Anime import AnimeModel
+
+
+def test_details_endpoint_runs_one_statement(client, make_anime, count_statements):
+    anime = make_anime("Cowboy Bebop", genres=["Action", "Space"], episodes=3)
+    anime_id = str(anime.anime_id)
+
+    with count_statements() as statements:
+        response = client.get(f"/v1/anime/{anime_id}")
+
+    assert response.status_code == 200
+    assert response.json["genres"] == ["Action", "Space"]
+    assert [episode["episode_number"] for episode in response.json["episodes"]] == [1, 2, 3]
+    assert response.json["anime_bookmarked"] is False
+    assert len(statements) == 1, statements
+
+
+def test_details_query_with_a_user_runs_one_statement(session, make_anime, count_statements):
+    anime = make_anime("Mushishi", genres=["Slice of life"], episodes=2)
+    anime_id = anime.anime_id
+    session.expunge_all()
+
+    with count_statements() as statements:
+        anime, genre_names, episodes, bookmarked = AnimeModel.find_details_by_id(anime_id, user_id=1)
+
+    assert anime.title == "Mushishi"
+    assert genre_names == ["Slice of life"]
+    assert len(episodes) == 2
+    assert bookmarked is False
+    assert len(statements) == 1, statements
@@ -0,0 +1,61 @@
+import pytest
+
+from models.Anime import AnimeModel
+from models.Genre import GenreModel
+
+GENRE_NAMES = [f"Genre {number}" for number in range(1, 13)]
+
+
+@pytest.fixture
+def genres(session):
+    for genre_name in GENRE_NAMES:
+        GenreModel(genre_name=genre_name).save_to_db()
+    return GENRE_NAMES
+
+
+def new_anime(title):
+    return AnimeModel(
+        title=title,
+        rating=7.5,
+        release="2021",
+        status="Airing",
+        synopsis="A synopsis.",
+        number_of_episodes=12,
+        poster_uri="https://example.com/poster.jpg"
+    )
+
+
+def genre_names_of(anime_id):
+    return sorted(genre.genre_name for genre in AnimeModel.find_by_id(anime_id).genres)
+
+
+def test_create_sends_the_same_statements_for_any_number_of_genres(genres, count_statements):
+    counts = {}
+    for genre_count in (1, 4, 12):
+        anime = new_anime(f"Anime with {genre_count} genres")
+        with count_statements() as statements:
+            anime_id = anime.save_to_db(genres[:genre_count])
+        counts[genre_count] = len(statements)
+        assert genre_names_of(anime_id) == sorted(genres[:genre_count])
+
+    assert counts[1] == counts[4] == counts[12], counts
+
+
+def test_edit_sends_the_same_statements_for_any_number_of_changed_genres(genres, count_statements):
+    counts = {}
+    for kept, changed in ((1, 1), (2, 8), (0, 6)):
+        anime = new_anime(f"Anime edited {kept}/{changed}")
+        anime_id = anime.save_to_db(genres[:kept + changed])
+        # keep the first `kept` genres, swap the others for the remaining ones
+        wanted = genres[:kept] + genres[kept + changed:]
+        with count_statements() as statements:
+            anime.save_to_db(wanted)
+        counts[(kept, changed)] = len(statements)
+        assert genre_names_of(anime_id) == sorted(wanted)
+
+    assert len(set(counts.values())) == 1, counts
+
+
+def test_unknown_genres_are_skipped(genres):
+    anime_id = new_anime("Anime with an unknown genre").save_to_db(["Genre 1", "No such genre"])
+    assert genre_names_of(anime_id) == ["Genre 1"]
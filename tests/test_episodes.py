@@ -0,0 +1,29 @@
+import uuid
+
+import pytest
+
+from models.Episode import EpisodeModel, EpisodeNumberTaken
+
+
+def new_episode(anime_id, number):
+    return EpisodeModel(
+        anime_id=anime_id,
+        episode_number=number,
+        episode_uri_1=f"https://example.com/episodes/{number}.mp4"
+    )
+
+
+def test_saving_a_taken_number_raises(make_anime):
+    anime = make_anime("Anime with episodes", episodes=2)
+    # as if another request took the number after this one checked it
+    with pytest.raises(EpisodeNumberTaken):
+        new_episode(anime.anime_id, 2).save_to_db()
+
+    episode = EpisodeModel.find_by_number(anime.anime_id, 1)
+    episode.episode_number = 2
+    with pytest.raises(EpisodeNumberTaken):
+        episode.save_to_db()
+
+
+def test_saving_for_a_missing_anime_returns_none(session):
+    assert new_episode(uuid.uuid4(), 1).save_to_db() is None
@@ -0,0 +1,54 @@
+import uuid
+
+import pytest
+
+from models.Anime import AnimeModel
+from helpers.pagination import InvalidCursor, cursor_scope, encode_cursor, decode_cursor
+
+ANIME_ID = "9b2e3f4a-1c5d-4e6f-8a7b-0c1d2e3f4a5b"
+
+
+@pytest.mark.parametrize("sort_by, values", [
+    ("title", ["Attack on Titan", ANIME_ID]),
+    ("rating", [8.5, ANIME_ID]),
+    ("rating", [8, ANIME_ID]),
+    ("popular", [120, ANIME_ID]),
+])
+def test_decode_gives_the_types_of_the_sort_keys(sort_by, values):
+    keys, _ = AnimeModel.sort_keys(sort_by)
+    position = decode_cursor(encode_cursor(sort_by, values), sort_by, keys)
+    assert position["values"][-1] == uuid.UUID(ANIME_ID)
+    assert isinstance(position["values"][0], keys[0].type.python_type)
+
+
+@pytest.mark.parametrize("sort_by, values", [
+    ("title", ["Attack on Titan", "not-a-uuid"]),
+    ("title", ["Attack on Titan", 42]),
+    ("title", [["Attack on Titan"], ANIME_ID]),
+    ("title", ["Attack\x00on Titan", ANIME_ID]),
+    ("rating", ["high", ANIME_ID]),
+    ("rating", [True, ANIME_ID]),
+    ("popular", [12.5, ANIME_ID]),
+    ("popular", [None, ANIME_ID]),
+    ("popular", [120]),
+])
+def test_decode_rejects_values_that_dont_fit_the_sort_keys(sort_by, values):
+    keys, _ = AnimeModel.sort_keys(sort_by)
+    with pytest.raises(InvalidCursor):
+        decode_cursor(encode_cursor(sort_by, values), sort_by, keys)
+
+
+def test_decode_rejects_a_cursor_of_another_sort_method():
+    keys, _ = AnimeModel.sort_keys("rating")
+    with pytest.raises(InvalidCursor):
+        decode_cursor(encode_cursor("popular", [120, ANIME_ID]), "rating", keys)
+
+
+@pytest.mark.parametrize("path, sort_by, values, scope", [
+    ("/v1/animes?sort_by=title&cursor=", "title", ["Attack on Titan", "not-a-uuid"], None),
+    ("/v1/animes?sort_by=popular&cursor=", "popular", ["many", ANIME_ID], None),
+    ("/v1/search?q=titan&cursor=", "relevance", ["0.5", ANIME_ID], cursor_scope("titan", None, None)),
+])
+def test_tampered_cursor_is_a_bad_request(client, path, sort_by, values, scope):
+    cursor = encode_cursor(sort_by, values, scope=scope)
+    assert client.get(path + cursor).status_code == 400
@@ -0,0 +1,201 @@
+'''
+EXPLAIN checks of the hot catalog queries.
+
+The queries are captured while the model methods run and explained with the
+same parameters against a seeded catalog. Seq scans and sorts are switched off
+for the EXPLAIN, so the planner only falls back to them when no index can
+serve the query; a Seq Scan or Sort node in the plan therefore means a missing
+or unusable index rather than a small table.
+'''
+import pytest
+from sqlalchemy import event
+
+from db import db
+from models.Anime import AnimeModel
+from models.Genre import GenreModel
+from models.User import UserModel
+
+SEEDED_ANIMES = 20000
+SEEDED_GENRES = 40
+SEEDED_USERS = 2000
+# tables a hot query must never scan in full
+HOT_TABLES = {"anime_info", "anime_genres", "episodes", "user_animes"}
+
+SEED = (
+    f"""
+    INSERT INTO genres (genre_name, genre_explanation)
+    SELECT 'Genre ' || g, 'Explanation' FROM generate_series(1, {SEEDED_GENRES}) g
+    """,
+    f"""
+    INSERT INTO anime_info
+        (anime_id, title, rating, release, status, synopsis, number_of_episodes, poster_uri, save_count)
+    SELECT md5('anime' || i)::uuid, 'Anime ' || i, (i % 100) / 10.0, '2020',
+           CASE WHEN i % 3 = 0 THEN 'Airing' ELSE 'Completed' END,
+           'A story about keyword' || (i % 1000) || ' and more', 5,
+           'https://example.com/' || i || '.jpg', i % 700
+    FROM generate_series(1, {SEEDED_ANIMES}) i
+    """,
+    """
+    INSERT INTO anime_genres (anime_id, genre_id)
+    SELECT a.anime_id, g.genre_id
+    FROM anime_info a JOIN genres g ON abs(hashtext(a.title || g.genre_name)) % 20 = 0
+    """,
+    """
+    INSERT INTO episodes (episode_id, anime_id, episode_number, episode_uri_1)
+    SELECT md5('episode' || a.anime_id || n)::uuid, a.anime_id, n, 'https://example.com/episode.mp4'
+    FROM anime_info a, generate_series(1, 5) n
+    """,
+    f"""
+    INSERT INTO users (_id, username, email, password)
+    SELECT u, 'user' || u, 'user' || u || '@example.com', 'hash'
+    FROM generate_series(1, {SEEDED_USERS}) u
+    """,
+    """
+    INSERT INTO user_animes (user_id, anime_id)
+    SELECT u._id, a.anime_id
+    FROM users u JOIN anime_info a ON abs(hashtext(a.title || u.username)) % 500 = 0
+    """,
+)
+
+
+@pytest.fixture(scope="module")
+def catalog(app):
+    for statement in SEED:
+        db.session.execute(statement)
+    db.session.commit()
+    db.session.execute("ANALYZE")
+    db.session.commit()
+
+    yield
+
+    db.session.rollback()
+    for table in reversed(db.metadata.sorted_tables):
+        db.session.execute(table.delete())
+    db.session.commit()
+
+
+def capture(call):
+    '''(statement, parameters) of every statement `call` sends.'''
+    captured = []
+
+    def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        captured.append((statement, parameters))
+
+    event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        call()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+    return captured
+
+
+def plan_nodes(statement, parameters):
+    connection = db.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SET LOCAL enable_seqscan = off")
+        cursor.execute("SET LOCAL enable_sort = off")
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {statement}", parameters)
+        plan = cursor.fetchone()[0][0]["Plan"]
+    finally:
+        connection.rollback()
+        connection.close()
+
+    nodes, pending = [], [plan]
+    while pending:
+        node = pending.pop()
+        nodes.append(node)
+        pending.extend(node.get("Plans", []))
+    return nodes
+
+
+def assert_served_by(statement, parameters, indexes, ordered):
+    nodes = plan_nodes(statement, parameters)
+    seq_scans = [
+        node["Relation Name"] for node in nodes
+        if node["Node Type"] == "Seq Scan" and node["Relation Name"] in HOT_TABLES
+    ]
+    assert not seq_scans, f"seq scan on {seq_scans}: {statement}"
+
+    used = {node["Index Name"] for node in nodes if "Index Name" in node}
+    assert set(indexes) <= used, f"{set(indexes) - used} not used: {statement}"
+
+    if ordered:
+        sorts = [node for node in nodes if node["Node Type"] in ("Sort", "Incremental Sort")]
+        assert not sorts, f"sorted outside the index: {statement}"
+
+
+def only_statement(captured, containing="LIMIT"):
+    statements = [(statement, parameters) for statement, parameters in captured if containing in statement]
+    assert len(statements) == 1, captured
+    return statements[0]
+
+
+SORT_INDEXES = {
+    "title": "ix_anime_info_title_anime_id",
+    "rating": "ix_anime_info_rating_anime_id",
+    "popular": "ix_anime_info_save_count_anime_id",
+}
+
+
+@pytest.mark.parametrize("sort_by", AnimeModel.SORT_METHODS)
+def test_page_listing(catalog, sort_by):
+    captured = capture(lambda: AnimeModel.animes_list(5, sort_by))
+    # the page itself, the count(*) paginate adds is a full count by design
+    assert_served_by(*only_statement(captured), [SORT_INDEXES[sort_by]], ordered=True)
+
+
+@pytest.mark.parametrize("sort_by", AnimeModel.SORT_METHODS)
+def test_cursor_listing(catalog, sort_by):
+    first_page = AnimeModel.animes_list_by_cursor(None, sort_by)
+    captured = capture(lambda: AnimeModel.animes_list_by_cursor(first_page.next_cursor, sort_by))
+    assert_served_by(*only_statement(captured), [SORT_INDEXES[sort_by]], ordered=True)
+
+
+@pytest.mark.parametrize("sort_by", AnimeModel.SORT_METHODS)
+def test_genre_cursor_listing(catalog, sort_by):
+    genre = GenreModel.find_by_name("Genre 7")
+    first_page = AnimeModel.animes_list_by_cursor(None, sort_by, genre.animes)
+    captured = capture(lambda: AnimeModel.animes_list_by_cursor(first_page.next_cursor, sort_by, genre.animes))
+    assert_served_by(*only_statement(captured), ["pk_anime_genres"], ordered=False)
+
+
+def test_genre_page_listing(catalog):
+    genre = GenreModel.find_by_name("Genre 7")
+    captured = capture(lambda: genre.animes.
+                       with_entities(*AnimeModel.listing_columns()).
+                       order_by(*AnimeModel.listing_order("title")).
+                       paginate(2, 24, False))
+    assert_served_by(*only_statement(captured), ["pk_anime_genres"], ordered=False)
+
+
+@pytest.mark.parametrize("genre_name, status", [(None, None), ("Genre 7", "Completed")])
+def test_search(catalog, genre_name, status):
+    captured = capture(lambda: AnimeModel.search("keyword17", None, genre_name, status))
+    # ranked results are sorted by relevance, only the match must come from the index
+    assert_served_by(*only_statement(captured), ["ix_anime_info_search_vector"], ordered=False)
+
+
+def test_details(catalog):
+    anime_id = db.session.execute("SELECT anime_id FROM anime_info WHERE title = 'Anime 4242'").scalar()
+    captured = capture(lambda: AnimeModel.find_details_by_id(anime_id, user_id=7))
+    statement, parameters = only_statement(captured, containing="anime_info")
+    assert_served_by(
+        statement,
+        parameters,
+        ["ix_anime_genres_anime_id", "uq_episodes_anime_id_episode_number", "pk_user_animes"],
+        ordered=False
+    )
+
+
+def test_saved_animes(catalog):
+    captured = capture(lambda: UserModel.saved_animes_list(7))
+    statement, parameters = only_statement(captured, containing="user_animes")
+    assert_served_by(statement, parameters, ["pk_user_animes"], ordered=False)
+
+
+def test_has_user_saved_anime(catalog):
+    anime_id = db.session.execute("SELECT anime_id FROM anime_info WHERE title = 'Anime 99'").scalar()
+    captured = capture(lambda: UserModel.has_user_saved_anime(7, anime_id))
+    statement, parameters = only_statement(captured, containing="user_animes")
+    assert_served_by(statement, parameters, ["pk_user_animes"], ordered=False)
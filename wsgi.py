@@ -1,6 +1,9 @@
 from app import app
 from db import db
 from ma import ma
+from helpers.recommender import recommender
+from helpers.autocomplete import title_index
+from helpers.genre_index import genre_index
 
 db.init_app(app)
 ma.init_app(app)
@@ -11,5 +14,28 @@ def create_tables():
     db.create_all()
 
 
+def warm_up():
+    '''Loads the in-memory indexes, called once per worker before it serves requests.'''
+    with app.app_context():
+        try:
+            if not recommender.load():
+                print("[Recommender]: no artifact in the database, /similar and /for_you "
+                      "stay empty until flask build-recommender has run")
+        except Exception as ex:
+            print(f"[Recommender]: {ex}")
+
+        try:
+            title_index.load()
+        except Exception as ex:
+            # suggest() loads it on first use then
+            print(f"[Autocomplete]: {ex}")
+
+        try:
+            genre_index.rebuild()
+        except Exception as ex:
+            print(f"[Genre Index]: {ex}")
+
+
 if __name__ == "__main__":
+    warm_up()
     app.run()